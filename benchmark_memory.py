@@ -0,0 +1,22 @@
+"""
+Measures the memory footprint of every shipped map's level and the garbage
+allocated per update (see data/memory_benchmark.py).  Example:
+
+    python benchmark_memory.py --ticks 600 -v central.map
+"""
+
+import os
+import sys
+
+#Must be set before data.prepare is imported.
+os.environ["CABBAGES_HEADLESS"] = "1"
+
+import pygame as pg
+
+from data.memory_benchmark import main
+
+
+if __name__ == '__main__':
+    main()
+    pg.quit()
+    sys.exit()
@@ -0,0 +1,15 @@
+"""
+Times loading every shipped map with the pure Python YAML loader, the fast
+in-memory loader and, when LibYAML is available, the C loader (see
+data/yaml_loader.py).  Pass --check to verify that the fast loader gives the
+same events as the Python loader on every data file.
+"""
+
+import sys
+
+from data.yaml_loader import main
+
+
+if __name__ == '__main__':
+    main()
+    sys.exit()
@@ -0,0 +1,15 @@
+"""
+Packs the map, enemy, object and equipment sheets into texture atlases in
+resources/graphics/atlas (see data/atlas.py).  The game uses the atlas when
+it has been built and falls back to the individual sheets otherwise.  Run
+again after editing any sheet.
+"""
+
+import sys
+
+from data.atlas import main
+
+
+if __name__ == '__main__':
+    main()
+    sys.exit()
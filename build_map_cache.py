@@ -0,0 +1,15 @@
+"""
+Compiles all maps in resources/map_data to their binary cache files ahead of
+time.  The game will compile any missing or stale caches on its own, but
+running this beforehand avoids paying the YAML parsing cost during play.
+Pass -f to rebuild every cache regardless of whether it is current.
+"""
+
+import sys
+
+from data.map_cache import main
+
+
+if __name__ == '__main__':
+    main()
+    sys.exit()
@@ -0,0 +1,196 @@
+"""
+This module builds and reads texture atlases.  Every non-empty cell of the
+map sheets and the enemy and object sheets is packed (with duplicate cells
+stored once) into a few large page images, alongside a JSON index giving
+each cell's page and position.  At runtime an Atlas hands out
+frames by name, so tiles and sprites blit from a handful of surfaces instead
+of loading and converting every source sheet.
+
+Atlases are built offline with build_atlas.py.  The index records the
+modification time of each source sheet; frames of a sheet that has changed
+since the atlas was built are ignored (and taken from the sheet instead)
+until the atlas is rebuilt.
+
+Index layout:
+    version: the format version
+    cell_size: the size of every frame
+    pages: file names of the page images
+    sheets: "directory/sheet" to the source modification time
+    frames: "directory/sheet/x,y" (pixel location) to [page, x, y]
+"""
+
+import os
+import json
+import argparse
+import pygame as pg
+
+from . import tools
+
+
+GRAPHICS_DIRECTORY = os.path.join("resources", "graphics")
+ATLAS_DIRECTORY = os.path.join(GRAPHICS_DIRECTORY, "atlas")
+INDEX_NAME = "atlas.json"
+PAGE_NAME = "atlas{}.png"
+FORMAT_VERSION = 1
+#Directories whose cells are read through prepare.get_cell.  Equipment
+#frames are cut from their sheets in many layouts, so they are not packed.
+SOURCES = ["mapsheets", "enemies", "objects"]
+PAGE_SIZE = (1000, 1000)
+CELL_SIZE = (50, 50) #Matches prepare.CELL_SIZE.
+COLOR_KEY = (255, 0, 255) #Matches prepare.COLOR_KEY.
+ACCEPT = (".png", ".jpg", ".bmp")
+
+
+def frame_name(directory, sheet, location):
+    """Return the index name of the frame at location on a sheet."""
+    return "{}/{}/{},{}".format(directory, sheet, location[0], location[1])
+
+
+class Atlas(object):
+    """
+    The runtime side of an atlas.  Pages are loaded and converted the first
+    time a frame on them is requested.
+    """
+    def __init__(self, index, directory=ATLAS_DIRECTORY):
+        self.directory = directory
+        self.cell_size = tuple(index["cell_size"])
+        self.page_names = index["pages"]
+        self.pages = {}
+        self.subsurfaces = {}
+        stale = set(get_stale_sheets(index["sheets"]))
+        self.frames = {}
+        for name,location in index["frames"].items():
+            if name.rsplit("/", 1)[0] not in stale:
+                self.frames[name] = location
+
+    def __contains__(self, name):
+        return name in self.frames
+
+    def get_page(self, number):
+        """Return the page surface, loading it if needed."""
+        if number not in self.pages:
+            path = os.path.join(self.directory, self.page_names[number])
+            self.pages[number] = pg.image.load(path).convert_alpha()
+        return self.pages[number]
+
+    def get_frame(self, name):
+        """
+        Return the named frame as a subsurface of its page.  Frames are
+        shared; every request for a name returns the same surface.
+        """
+        if name not in self.subsurfaces:
+            page, x, y = self.frames[name]
+            rect = pg.Rect((x, y), self.cell_size)
+            self.subsurfaces[name] = self.get_page(page).subsurface(rect)
+        return self.subsurfaces[name]
+
+
+def get_stale_sheets(sheets, base=GRAPHICS_DIRECTORY):
+    """
+    Return the sheets ("directory/sheet" names) whose source has changed or
+    disappeared since their modification time was recorded.
+    """
+    paths = {}
+    for directory in set(sheet.split("/")[0] for sheet in sheets):
+        found = tools.find_files(os.path.join(base, directory), ACCEPT)
+        for name,path in found:
+            paths["{}/{}".format(directory, name)] = path
+    stale = []
+    for sheet,mtime in sheets.items():
+        path = paths.get(sheet)
+        if not path or os.path.getmtime(path) != mtime:
+            stale.append(sheet)
+    return stale
+
+
+def load_atlas(directory=ATLAS_DIRECTORY):
+    """
+    Load the atlas in directory.  Returns None if no atlas has been built or
+    its index is unreadable or from another format version.
+    """
+    try:
+        with open(os.path.join(directory, INDEX_NAME)) as myfile:
+            index = json.load(myfile)
+    except (IOError, OSError, ValueError):
+        return None
+    if index.get("version") != FORMAT_VERSION:
+        return None
+    return Atlas(index, directory)
+
+
+def get_cells(sheet, cell_size=CELL_SIZE):
+    """
+    Yield the location and subsurface of each whole, non-empty cell of a
+    sheet.  A cell is empty if it is entirely transparent (or colorkey).
+    """
+    width, height = cell_size
+    for y in range(0, sheet.get_height()-height+1, height):
+        for x in range(0, sheet.get_width()-width+1, width):
+            cell = sheet.subsurface(pg.Rect((x, y), cell_size))
+            if pg.mask.from_surface(cell).count():
+                yield (x, y), cell
+
+
+def build_atlas(sources=SOURCES, directory=ATLAS_DIRECTORY,
+                page_size=PAGE_SIZE, cell_size=CELL_SIZE):
+    """
+    Pack every non-empty cell of the sheets in the source directories into
+    pages and write them with their index to directory.  Cells with
+    identical pixels are stored once.  Returns the index.
+    """
+    columns = page_size[0]//cell_size[0]
+    per_page = columns*(page_size[1]//cell_size[1])
+    pages = []
+    slots = {} #Cell pixels to [page, x, y].
+    index = {"version" : FORMAT_VERSION,
+             "cell_size" : list(cell_size),
+             "pages" : [],
+             "sheets" : {},
+             "frames" : {}}
+    for source in sources:
+        path = os.path.join(GRAPHICS_DIRECTORY, source)
+        for sheet_name,sheet_path in tools.find_files(path, ACCEPT):
+            sheet = pg.image.load(sheet_path)
+            if not sheet.get_alpha():
+                sheet.set_colorkey(COLOR_KEY)
+            sheet_key = "{}/{}".format(source, sheet_name)
+            index["sheets"][sheet_key] = os.path.getmtime(sheet_path)
+            for location,cell in get_cells(sheet, cell_size):
+                image = pg.Surface(cell_size, pg.SRCALPHA)
+                image.blit(cell, (0,0))
+                pixels = pg.image.tostring(image, "RGBA")
+                if pixels not in slots:
+                    number = len(slots)
+                    page, slot = divmod(number, per_page)
+                    if page == len(pages):
+                        pages.append(pg.Surface(page_size, pg.SRCALPHA))
+                    x = (slot%columns)*cell_size[0]
+                    y = (slot//columns)*cell_size[1]
+                    pages[page].blit(image, (x, y))
+                    slots[pixels] = [page, x, y]
+                name = frame_name(source, sheet_name, location)
+                index["frames"][name] = slots[pixels]
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for number,page in enumerate(pages):
+        page_name = PAGE_NAME.format(number)
+        pg.image.save(page, os.path.join(directory, page_name))
+        index["pages"].append(page_name)
+    with open(os.path.join(directory, INDEX_NAME), "w") as myfile:
+        json.dump(index, myfile, sort_keys=True)
+    return index
+
+
+def main():
+    """Command line interface for building the atlas."""
+    parser = argparse.ArgumentParser(description="Build the texture atlas.")
+    parser.add_argument("-o", "--output", default=ATLAS_DIRECTORY,
+                        help="directory to write the atlas to")
+    args = parser.parse_args()
+    pg.init()
+    index = build_atlas(directory=args.output)
+    frames = index["frames"]
+    unique = len(set(tuple(location) for location in frames.values()))
+    message = "Packed {} frames ({} unique) from {} sheets into {} page(s)."
+    print(message.format(len(frames), unique, len(index["sheets"]),
+                         len(index["pages"])))
@@ -0,0 +1,174 @@
+"""
+Contains a sprite group that indexes its sprites in a spatial hash.
+Collision queries against the group only test sprites in the cells that the
+querying rect overlaps, so their cost depends on how crowded that area of the
+map is rather than on the total number of sprites.  Also contains the grid of
+walkable cells used by enemy AI.
+"""
+
+import pygame as pg
+
+from .. import prepare
+
+
+def get_cells(rect, cell_size=prepare.CELL_SIZE):
+    """Return a tuple of the cells (column, row) that rect overlaps."""
+    width, height = cell_size
+    left, top = rect.x//width, rect.y//height
+    right = (rect.right-1)//width if rect.w else left
+    bottom = (rect.bottom-1)//height if rect.h else top
+    return tuple((column, row) for column in range(left, right+1)
+                               for row in range(top, bottom+1))
+
+
+class CollisionGrid(pg.sprite.Group):
+    """
+    A sprite group for sprites that (almost) never move, bucketed by the map
+    cells their rects overlap.  Sprites are indexed once when added; any
+    that can still move (push blocks) must be registered with track, and are
+    re-bucketed at the start of each query if their cells have changed.
+    Groups of sprites that move every update (enemies, items, projectiles)
+    are kept as plain groups: checking whether a sprite has changed cells
+    costs more than testing it for a collision, and these groups are only
+    queried once or twice an update.
+
+    Buckets are lists in the order sprites entered them, so query results
+    are in a fixed order: by cell, then by entry into the cell's bucket.
+    """
+    def __init__(self, *sprites, **kwargs):
+        """
+        Accepts the same arguments as pg.sprite.Group, plus the keyword
+        cell_size (default prepare.CELL_SIZE).
+        """
+        self.cell_size = kwargs.get("cell_size", prepare.CELL_SIZE)
+        self.buckets = {}
+        self.locations = {}
+        self.tracked = []
+        pg.sprite.Group.__init__(self, *sprites)
+
+    def add_internal(self, sprite, *args):
+        pg.sprite.Group.add_internal(self, sprite, *args)
+        if sprite not in self.locations:
+            self.locations[sprite] = ()
+            self.bucket(sprite)
+
+    def remove_internal(self, sprite):
+        pg.sprite.Group.remove_internal(self, sprite)
+        for cell in self.locations.pop(sprite, ()):
+            bucket = self.buckets[cell]
+            bucket.remove(sprite)
+            if not bucket:
+                del self.buckets[cell]
+        if sprite in self.tracked:
+            self.tracked.remove(sprite)
+
+    def track(self, *sprites):
+        """Register sprites that may still move."""
+        for sprite in sprites:
+            if sprite not in self.tracked:
+                self.tracked.append(sprite)
+
+    def bucket(self, sprite):
+        """Move sprite to the buckets of the cells its rect now overlaps."""
+        cells = get_cells(sprite.rect, self.cell_size)
+        old_cells = self.locations[sprite]
+        if cells != old_cells:
+            for cell in old_cells:
+                bucket = self.buckets[cell]
+                bucket.remove(sprite)
+                if not bucket:
+                    del self.buckets[cell]
+            for cell in cells:
+                self.buckets.setdefault(cell, []).append(sprite)
+            self.locations[sprite] = cells
+
+    def refresh(self):
+        """Re-bucket any tracked sprites that have changed cells."""
+        for sprite in self.tracked:
+            self.bucket(sprite)
+
+    def get_nearby(self, rect):
+        """Return the sprites sharing a cell with rect."""
+        if self.tracked:
+            self.refresh()
+        cells = get_cells(rect, self.cell_size)
+        if len(cells) == 1:
+            return self.buckets.get(cells[0], ())
+        nearby = []
+        for cell in cells:
+            for sprite in self.buckets.get(cell, ()):
+                if sprite not in nearby:
+                    nearby.append(sprite)
+        return nearby
+
+    def collide(self, sprite, collided=None):
+        """
+        Equivalent to pg.sprite.spritecollide(sprite, self, False, collided)
+        but only tests nearby sprites.
+        """
+        nearby = self.get_nearby(sprite.rect)
+        if collided:
+            return [other for other in nearby if collided(sprite, other)]
+        rect = sprite.rect
+        return [other for other in nearby if rect.colliderect(other.rect)]
+
+    def collide_any(self, sprite, collided=None):
+        """
+        Equivalent to pg.sprite.spritecollideany(sprite, self, collided)
+        but only tests nearby sprites.
+        """
+        for other in self.get_nearby(sprite.rect):
+            if collided:
+                if collided(sprite, other):
+                    return other
+            elif sprite.rect.colliderect(other.rect):
+                return other
+        return None
+
+
+class WalkabilityGrid(object):
+    """
+    A count of the solid sprites covering each cell of the play area (20x14
+    cells).  A cell is walkable if no solid covers it; cells outside the play
+    area are never walkable.  Solids that can move (push blocks) are
+    registered with track and their counts are updated before each lookup if
+    they have changed cells.
+    """
+    def __init__(self, solids, size=prepare.PLAY_RECT.size,
+                 cell_size=prepare.CELL_SIZE):
+        self.cell_size = cell_size
+        self.columns = size[0]//cell_size[0]
+        self.rows = size[1]//cell_size[1]
+        self.counts = [0]*(self.columns*self.rows)
+        self.locations = {}
+        self.tracked = set()
+        for sprite in solids:
+            self.locations[sprite] = get_cells(sprite.rect, cell_size)
+            self.mark(self.locations[sprite], 1)
+
+    def mark(self, cells, amount):
+        """Add amount to the count of each cell inside the play area."""
+        for column,row in cells:
+            if 0 <= column < self.columns and 0 <= row < self.rows:
+                self.counts[row*self.columns+column] += amount
+
+    def track(self, *sprites):
+        """Register solids that may move."""
+        self.tracked.update(sprites)
+
+    def refresh(self):
+        """Update the counts of any tracked solids that have changed cells."""
+        for sprite in self.tracked:
+            cells = get_cells(sprite.rect, self.cell_size)
+            if cells != self.locations[sprite]:
+                self.mark(self.locations[sprite], -1)
+                self.mark(cells, 1)
+                self.locations[sprite] = cells
+
+    def is_walkable(self, cell):
+        """Check if the cell (column, row) is in the play area and clear."""
+        self.refresh()
+        column, row = cell
+        if 0 <= column < self.columns and 0 <= row < self.rows:
+            return not self.counts[row*self.columns+column]
+        return False
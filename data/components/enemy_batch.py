@@ -0,0 +1,111 @@
+"""
+An optional batched simulation core for enemies.  The exact positions,
+previous positions, steps and velocities of a level's enemies are stored as
+arrays with a row per enemy (a structure of arrays), and every walking enemy
+is moved in a single vectorized step at the start of each level update.
+Each enemy's exact_position, old_position and steps are views of its rows,
+so the rest of its update (AI, knockback, animation) and all drawing and
+collision code use the same data unchanged.
+
+Batching needs NumPy and is off by default (see level.BATCH_ENEMIES).  A
+batched move performs the same arithmetic as _Enemy.move, so results match
+the unbatched simulation exactly.
+"""
+
+from .. import prepare
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+INITIAL_CAPACITY = 32
+
+
+class EnemyBatch(object):
+    """
+    Array backed movement state for the enemies of a level.  Enemies are
+    added once when spawned and keep their row for the life of the level.
+    """
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        if np is None:
+            raise ImportError("Batched enemies require NumPy.")
+        self.sprites = []
+        self.positions = np.zeros((capacity, 2))
+        self.old_positions = np.zeros((capacity, 2))
+        self.steps = np.zeros((capacity, 2))
+        self.velocities = np.zeros((capacity, 2))
+        self.walking = np.zeros(capacity, dtype=bool) #Moves next step.
+        self.moved = np.zeros(capacity, dtype=bool) #Moved by the last step.
+        self.arrived = np.zeros(capacity, dtype=bool) #Moved to a new cell.
+
+    def add(self, sprite):
+        """Give sprite a row, making its movement state views of the row."""
+        slot = len(self.sprites)
+        if slot == len(self.walking):
+            self.grow()
+        self.positions[slot] = sprite.exact_position
+        self.old_positions[slot] = sprite.old_position
+        self.steps[slot] = sprite.steps
+        self.sprites.append(sprite)
+        sprite.batch = self
+        sprite.batch_slot = slot
+        self.bind(sprite)
+        self.update_sprite(sprite)
+
+    def bind(self, sprite):
+        """Point the sprite's movement attributes at its rows."""
+        slot = sprite.batch_slot
+        sprite.exact_position = self.positions[slot]
+        sprite.old_position = self.old_positions[slot]
+        sprite.steps = self.steps[slot]
+
+    def grow(self):
+        """Double the capacity of the arrays and rebind every sprite."""
+        for name in ("positions", "old_positions", "steps", "velocities",
+                     "walking", "moved", "arrived"):
+            old = getattr(self, name)
+            new = np.zeros((len(old)*2,)+old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        for sprite in self.sprites:
+            self.bind(sprite)
+
+    def update_sprite(self, sprite):
+        """
+        Record whether sprite will walk in the next step, and its velocity.
+        Must be called whenever the sprite's state, direction, speed or
+        busy flag may have changed.
+        """
+        slot = sprite.batch_slot
+        walking = sprite.is_walking()
+        self.walking[slot] = walking
+        if walking:
+            vector = prepare.DIRECT_DICT[sprite.direction]
+            self.velocities[slot] = (vector[0]*sprite.speed,
+                                     vector[1]*sprite.speed)
+
+    def step(self):
+        """
+        Store the previous position of every enemy and move the walking
+        ones by their velocity, adding the distance to their steps.  Moved
+        enemies whose steps reach the size of a cell have arrived.
+        """
+        count = len(self.sprites)
+        self.old_positions[:count] = self.positions[:count]
+        walking = self.walking[:count]
+        velocities = self.velocities[:count][walking]
+        self.positions[:count][walking] += velocities
+        self.steps[:count][walking] += np.abs(velocities)
+        self.moved[:count] = walking
+        reached = (self.steps[:count] >= prepare.CELL_SIZE).any(axis=1)
+        self.arrived[:count] = walking & reached
+
+    def was_moved(self, sprite):
+        """Return True if sprite was moved by the last step."""
+        return bool(self.moved[sprite.batch_slot])
+
+    def has_arrived(self, sprite):
+        """Return True if the last step moved sprite to a new cell."""
+        return bool(self.arrived[sprite.batch_slot])
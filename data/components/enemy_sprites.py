@@ -7,8 +7,8 @@ from .. import prepare, tools
 
 KNOCK_SPEED = 12.5  #Pixels per frame.
 
-ENEMY_SHEET = prepare.GFX["enemies"]["enemysheet"]
-ENEMY_SHEET_2 = prepare.GFX["enemies"]["enemysheet1"]
+ENEMY_SHEET = "enemysheet"
+ENEMY_SHEET_2 = "enemysheet1"
 
 ENEMY_COORDS = {
     "cabbage" : [(0,0),(1,0),(2,0),(3,0),(4,0),(5,0),(6,0)],
@@ -51,29 +51,30 @@ class BasicAI(object):
     def __init__(self, sprite):
         self.sprite = sprite
 
-    def __call__(self, obstacles):
+    def __call__(self, walkable):
         """Make AI classes callable."""
-        return self.get_direction(obstacles)
+        return self.get_direction(walkable)
 
-    def get_direction(self, obstacles):
+    def get_direction(self, walkable):
         """Return a new valid direction for the sprite."""
         new_dir = None
         while not new_dir:
             new_dir = random.choice(prepare.DIRECTIONS)
-            move = (prepare.DIRECT_DICT[new_dir][0]*prepare.CELL_SIZE[0],
-                    prepare.DIRECT_DICT[new_dir][1]*prepare.CELL_SIZE[1])
-            self.sprite.rect.move_ip(*move)
-            if self.check_collisions(obstacles):
+            if self.check_collisions(walkable, new_dir):
                 new_dir = None
-            self.sprite.rect.move_ip(-move[0], -move[1])
         return new_dir
 
-    def check_collisions(self, obstacles):
+    def check_collisions(self, walkable, direction):
         """
-        Check if the sprite attempts to leave the screen or move into a
-        solid obstacle.
+        Check if moving a cell in direction would make the sprite leave the
+        screen or move into a solid obstacle.  The walkable argument is the
+        level's collision.WalkabilityGrid; the sprite must be snapped to the
+        grid.
         """
-        return pg.sprite.spritecollideany(self.sprite, obstacles)
+        column = self.sprite.rect.x//prepare.CELL_SIZE[0]
+        row = self.sprite.rect.y//prepare.CELL_SIZE[1]
+        vector = prepare.DIRECT_DICT[direction]
+        return not walkable.is_walkable((column+vector[0], row+vector[1]))
 
 
 class LinearAI(BasicAI):
@@ -86,7 +87,7 @@ class LinearAI(BasicAI):
     def __init__(self, sprite):
         BasicAI.__init__(self, sprite)
 
-    def get_direction(self, obstacles):
+    def get_direction(self, walkable):
         """
         Try all other directions before attempting to go in the opposite
         direction.
@@ -101,12 +102,8 @@ class LinearAI(BasicAI):
         new_dir = None
         while directions and not new_dir:
             new_dir = directions.pop()
-            move = (prepare.DIRECT_DICT[new_dir][0]*prepare.CELL_SIZE[0],
-                    prepare.DIRECT_DICT[new_dir][1]*prepare.CELL_SIZE[1])
-            self.sprite.rect.move_ip(*move)
-            if self.check_collisions(obstacles):
+            if self.check_collisions(walkable, new_dir):
                 new_dir = None
-            self.sprite.rect.move_ip(-move[0], -move[1])
         return new_dir if new_dir else opposite
 
 
@@ -118,36 +115,39 @@ class CrabWalk(BasicAI):
     def __init__(self, sprite):
         BasicAI.__init__(self, sprite)
 
-    def __call__(self, obstacles):
+    def __call__(self, walkable):
         """Make AI classes callable."""
-        return self.get_direction(obstacles)
+        return self.get_direction(walkable)
 
-    def get_direction(self, obstacles):
+    def get_direction(self, walkable):
         """Sprite has a 3:4 chance of moving horizontally."""
         directions = ["front", "back"]+["left"]*3+["right"]*3
         random.shuffle(directions)
         new_dir = None
         while not new_dir:
             new_dir = directions.pop()
-            move = (prepare.DIRECT_DICT[new_dir][0]*prepare.CELL_SIZE[0],
-                    prepare.DIRECT_DICT[new_dir][1]*prepare.CELL_SIZE[1])
-            self.sprite.rect.move_ip(*move)
-            if self.check_collisions(obstacles):
+            if self.check_collisions(walkable, new_dir):
                 new_dir = None
-            self.sprite.rect.move_ip(-move[0], -move[1])
         return new_dir
 
 
 class _Enemy(tools._BaseSprite):
     """
-    The base class for all enemies.
+    The base class for all enemies.  If the level steps its enemies in an
+    enemy_batch.EnemyBatch then batch is set, and exact_position,
+    old_position and steps are views of the batch's arrays; they must be
+    changed in place rather than replaced.
     """
+    batchable = True
+    batch = None
+    batch_slot = None
+
     def __init__(self, name, sheet, pos, speed, *groups):
-        coords, size = ENEMY_COORDS[name], prepare.CELL_SIZE
-        tools._BaseSprite.__init__(self, pos, size, *groups)
-        self.frames = tools.strip_coords_from_sheet(sheet, coords, size)
-        self.mask = pg.Mask(prepare.CELL_SIZE)
-        self.mask.fill()
+        tools._BaseSprite.__init__(self, pos, prepare.CELL_SIZE, *groups)
+        self.sheet = sheet
+        self.coords = ENEMY_COORDS[name]
+        self.frames = prepare.get_frames("enemies", sheet, self.coords)
+        self.mask = prepare.get_solid_mask()
         self.steps = [0, 0]
         self.ai = BasicAI(self)
         self.speed = speed
@@ -166,6 +166,10 @@ class _Enemy(tools._BaseSprite):
         self.act_mid_step = False
         self.drops = [None]
 
+    def get_flipped_frames(self):
+        """Return horizontally flipped versions of self.frames."""
+        return prepare.get_frames("enemies", self.sheet, self.coords, True)
+
     def check_action(self, player, group_dict):
         pass
 
@@ -198,6 +202,8 @@ class _Enemy(tools._BaseSprite):
             elif self.state != "die":
                 self.drop_item(*item_groups)
                 self.state = "die"
+            if self.batch:
+                self.batch.update_sprite(self)
 
     def drop_item(self, *item_groups):
         """
@@ -212,7 +218,7 @@ class _Enemy(tools._BaseSprite):
         """
         Check the next 3 cells for collisions and set knock_collide to
         the first one found.  If none are found set knock_clear to the 4th rect
-        for a reference point.
+        for a reference point.  The obstacles must be a CollisionGrid.
         """
         self.knock_collide = None
         self.knock_clear = None
@@ -222,7 +228,7 @@ class _Enemy(tools._BaseSprite):
         for knocked_distance in (1, 2, 3):
             move = component*cell_size*knocked_distance
             self.rect[index] += move
-            collide = pg.sprite.spritecollideany(self, obstacles)
+            collide = obstacles.collide_any(self)
             self.rect[index] -= move
             if collide:
                 self.knock_collide = collide.rect
@@ -249,10 +255,10 @@ class _Enemy(tools._BaseSprite):
             current = self.direction in ("front", "back")
             step_near_zero = [int(step) for step in self.steps] == [0, 0]
             self.adjust_on_collide(test_rect, test_against, index)
-            self.exact_position = list(test_rect.topleft)
+            self.exact_position[:] = test_rect.topleft
             if (index == current and self.knock_collide) or step_near_zero:
                 #Makes update find a new direction next loop.
-                self.steps = list(prepare.CELL_SIZE)
+                self.steps[:] = prepare.CELL_SIZE
             self.knock_state = False
 
     def adjust_on_collide(self, rect_to_adjust, collide_rect, i):
@@ -270,20 +276,31 @@ class _Enemy(tools._BaseSprite):
         values in _Enemy.steps exceeding the prepare.CELL_SIZE the sprite
         will be snapped to the cell and their AI will be queried for a new
         direction.  Finally, update the sprite's rect and animation.
+        When batched, the batch has already stored the old position and
+        moved the sprite if it was walking.
         """
-        obstacles = group_dict["solid_border"]
-        self.old_position = self.exact_position[:]
+        walkable = group_dict["walkable"]
+        moved = self.batch and self.batch.was_moved(self)
+        if self.batch:
+            walk_state = (self.state, self.direction, self.busy)
+        else:
+            self.old_position[:] = self.exact_position
         if self.state not in ("hit", "die", "spawn"):
             if self.act_mid_step and not self.busy:
                 self.busy = self.check_action(player, group_dict)
-            if self.direction and not self.busy:
-                self.move()
+            if moved:
+                arrived = self.batch.has_arrived(self)
             else:
-                self.change_direction(obstacles)
-            if any(x >= prepare.CELL_SIZE[i] for i,x in enumerate(self.steps)):
+                if self.direction and not self.busy:
+                    self.move()
+                else:
+                    self.change_direction(walkable)
+                arrived = any(x >= prepare.CELL_SIZE[i]
+                              for i,x in enumerate(self.steps))
+            if arrived:
                 if not self.act_mid_step and not self.busy:
                     self.busy = self.check_action(player, group_dict)
-                self.change_direction(obstacles)
+                self.change_direction(walkable)
         if self.hit_state:
             self.hit_state.check_tick(now)
             self.getting_knocked()
@@ -297,6 +314,17 @@ class _Enemy(tools._BaseSprite):
             self.state = "walk"
         self.rect.topleft = self.exact_position
         self.image = self.get_anim().get_next_frame(now)
+        if self.batch and walk_state != (self.state,self.direction,self.busy):
+            self.batch.update_sprite(self)
+
+    def is_walking(self):
+        """
+        Return True if the sprite's next update will move it (used by the
+        enemy batch).
+        """
+        return bool(self.state not in ("hit", "die", "spawn")
+                    and self.direction and not self.busy
+                    and not self.act_mid_step)
 
     def move(self):
         """Move the sprites exact position and add to steps appropriately."""
@@ -305,21 +333,21 @@ class _Enemy(tools._BaseSprite):
             self.exact_position[i] += vec_component*self.speed
             self.steps[i] += abs(vec_component*self.speed)
 
-    def change_direction(self, obstacles):
+    def change_direction(self, walkable):
         """
         If either element of steps is greater than the corresponding
         element of CELL_SIZE, query AI for new direction.
         """
         self.snap_to_grid()
-        self.direction = self.ai(obstacles)
+        self.direction = self.ai(walkable)
         if self.direction in self.anim_directions:
             self.anim_direction = self.direction
 
     def snap_to_grid(self):
         """Reset steps and snap the sprite to its current cell."""
-        self.steps = [0, 0]
+        self.steps[:] = (0, 0)
         self.rect.topleft = self.get_occupied_cell()
-        self.exact_position = list(self.rect.topleft)
+        self.exact_position[:] = self.rect.topleft
 
     def get_anim(self):
         """Get the current frame from the appropriate animation."""
@@ -335,6 +363,8 @@ class _Enemy(tools._BaseSprite):
 
     def on_map_change(self):
         self.busy = False
+        if self.batch:
+            self.batch.update_sprite(self)
 
 
 class _BasicFrontFrames(_Enemy):
@@ -347,7 +377,7 @@ class _BasicFrontFrames(_Enemy):
         self.anims = {"walk" : tools.Anim(self.frames[:2], 7),
                       "hit" : tools.Anim(self.frames[2:4], 20),
                       "die" : None} #Set die in specific class declaration.
-        self.image = self.get_anim().get_next_frame(pg.time.get_ticks())
+        self.image = self.get_anim().get_next_frame(tools.get_ticks())
 
 
 class _SideFramesOnly(_Enemy):
@@ -361,18 +391,16 @@ class _SideFramesOnly(_Enemy):
         self.anim_directions = ["left", "right"]
         self.anim_direction = random.choice(self.anim_directions)
         self.ai = LinearAI(self)
+        flipped = self.get_flipped_frames()
         walk = {"left" : tools.Anim(self.frames[:2], 7),
-                "right" : tools.Anim([pg.transform.flip(self.frames[0], 1, 0),
-                                pg.transform.flip(self.frames[1], 1, 0)], 7)}
+                "right" : tools.Anim(flipped[:2], 7)}
         hit = {"left" : tools.Anim(self.frames[2:4], 20),
-               "right" : tools.Anim([pg.transform.flip(self.frames[2], 1, 0),
-                                pg.transform.flip(self.frames[3], 1, 0)], 20)}
-        die_frames = self.frames[4:]+[self.frames[-1]]
-        flipped_die = [pg.transform.flip(frame, 1, 0) for frame in die_frames]
+               "right" : tools.Anim(flipped[2:4], 20)}
+        flipped_die = flipped[4:]+[flipped[-1]]
         die = {"left" : tools.Anim(self.frames[4:], 5, 1),
                "right" : tools.Anim(flipped_die, 5, 1)}
         self.anims = {"walk" : walk, "hit" : hit, "die" : die}
-        self.image = self.get_anim().get_next_frame(pg.time.get_ticks())
+        self.image = self.get_anim().get_next_frame(tools.get_ticks())
 
 
 class _FourDirFrames(_Enemy):
@@ -383,18 +411,17 @@ class _FourDirFrames(_Enemy):
     def __init__(self, *args):
         _Enemy.__init__(self, *args)
         self.ai = LinearAI(self)
+        flipped = self.get_flipped_frames()
         walk = {"front" : tools.Anim(self.frames[:2], 7),
                 "back" : tools.Anim(self.frames[2:4], 7),
-                "left" : tools.Anim([pg.transform.flip(self.frames[4], 1, 0),
-                               pg.transform.flip(self.frames[5], 1, 0)], 7),
+                "left" : tools.Anim(flipped[4:6], 7),
                 "right" : tools.Anim(self.frames[4:6], 7)}
         hit = {"front" : tools.Anim(self.frames[6:8], 20),
                "back" : tools.Anim(self.frames[8:10], 20),
-               "left" : tools.Anim([pg.transform.flip(self.frames[10], 1, 0),
-                               pg.transform.flip(self.frames[11], 1, 0)], 20),
+               "left" : tools.Anim(flipped[10:12], 20),
                "right" : tools.Anim(self.frames[10:12], 20)}
         self.anims = {"walk" : walk, "hit" : hit, "die" : None}
-        self.image = self.get_anim().get_next_frame(pg.time.get_ticks())
+        self.image = self.get_anim().get_next_frame(tools.get_ticks())
 
 
 class Cabbage(_BasicFrontFrames):
@@ -540,24 +567,21 @@ class Skeleton(_Enemy):
         _Enemy.__init__(self,  "skeleton", ENEMY_SHEET, *args)
         self.ai = LinearAI(self)
         self.state = "spawn"
-        walk = {"front" : tools.Anim([self.frames[3],
-                               pg.transform.flip(self.frames[3], 1, 0)], 7),
-                "back" : tools.Anim([self.frames[2],
-                               pg.transform.flip(self.frames[2], 1, 0)], 7),
+        flipped = self.get_flipped_frames()
+        walk = {"front" : tools.Anim([self.frames[3], flipped[3]], 7),
+                "back" : tools.Anim([self.frames[2], flipped[2]], 7),
                 "left" : tools.Anim(self.frames[:2], 7),
-                "right" : tools.Anim([pg.transform.flip(self.frames[0], 1, 0),
-                               pg.transform.flip(self.frames[1], 1, 0)], 7)}
+                "right" : tools.Anim(flipped[:2], 7)}
         hit = {"front" : tools.Anim(self.frames[10:], 20),
                "back" : tools.Anim(self.frames[8:10], 20),
                "left" : tools.Anim(self.frames[6:8], 20),
-               "right" : tools.Anim([pg.transform.flip(self.frames[6], 1, 0),
-                               pg.transform.flip(self.frames[7], 1, 0)], 20)}
+               "right" : tools.Anim(flipped[6:8], 20)}
         die_frames = self.frames[3:5]+[self.frames[5]]*2
         self.anims = {"walk" : walk,
                       "hit" : hit,
                       "die" : tools.Anim(die_frames, 5, 1),
                       "spawn" : tools.Anim(die_frames[::-1], 3, 1)}
-        self.image = self.get_anim().get_next_frame(pg.time.get_ticks())
+        self.image = self.get_anim().get_next_frame(tools.get_ticks())
         self.health = 6
         self.attack = 6
         self.drops = ["heart", None]
@@ -576,7 +600,7 @@ class Daruma(_Enemy):
                "back" : tools.Anim(self.frames[6:8], 20)}
         die = tools.Anim(self.frames[8:], 10, 1)
         self.anims = {"walk" : walk, "hit" : hit, "die" : die}
-        self.image = self.get_anim().get_next_frame(pg.time.get_ticks())
+        self.image = self.get_anim().get_next_frame(tools.get_ticks())
         self.health = 6
         self.attack = 6
         self.drops = ["heart", None]
@@ -595,11 +619,11 @@ class EvilElf(_Enemy):
                 "back" : tools.Anim(self.frames[6:8], 20),
                 "left" : tools.Anim(self.frames[2:4], 20),
                 "right" : tools.Anim(self.frames[4:6], 20)}
-        death_args = (ENEMY_SHEET, (150,50), prepare.CELL_SIZE, 3)
-        death_frames = tools.strip_from_sheet(*death_args)
+        death_coords = [(3,1), (4,1), (5,1)]
+        death_frames = prepare.get_frames("enemies", ENEMY_SHEET, death_coords)
         die = tools.Anim(death_frames, 3, loops=1)
         self.anims = {"walk" : walk, "hit" : hit, "die" : die}
-        self.image = self.get_anim().get_next_frame(pg.time.get_ticks())
+        self.image = self.get_anim().get_next_frame(tools.get_ticks())
         self.health = 6
         self.attack = 6
         self.drops = ["heart", None]
@@ -607,6 +631,8 @@ class EvilElf(_Enemy):
 
 class FireBallGenerator(_Enemy):
     """Creates fireballs at a specified interval."""
+    batchable = False
+
     def __init__(self, target, speed, *groups):
         tools._BaseSprite.__init__(self, target, prepare.CELL_SIZE, *groups)
         self.image = pg.Surface((1,1)).convert_alpha() #Required by interface.
@@ -621,7 +647,7 @@ class FireBallGenerator(_Enemy):
         prevent projectiles from syncronizing.
         """
         self.timer = tools.Timer(self.speed)
-        self.timer.check_tick(pg.time.get_ticks())
+        self.timer.check_tick(tools.get_ticks())
 
     def collide_with_player(self, player):
         """The generator itself can not hit or be hit."""
@@ -213,21 +213,24 @@ class AttackSprite(pg.sprite.Sprite):
         self.player = None
         self.attacking = False
         self.delay_timer = tools.Timer(300)
-        self.frame_speed = [0, 0]
+        self.exact_position = [0, 0] #Shared with the player when attacking.
+        self.old_position = [0, 0]
 
     def start_attack(self, player):
         """
         Checks the time to see if the weapon's after attack delay has
-        elapsed.
+        elapsed.  The weapon moves with the player, so it shares the player's
+        position lists (which are updated in place) for interpolation.
         """
-        if self.delay_timer.check_tick(pg.time.get_ticks()):
+        if self.delay_timer.check_tick(tools.get_ticks()):
             self.attacking = True
             self.player = player
+            self.exact_position = player.exact_position
+            self.old_position = player.old_position
             return True
 
     def update(self, now, *args):
         """Updated in the Level objects update phase."""
-        self.frame_speed = self.player.frame_speed
         self.anim = self.anims[self.player.direction]
         if self.anim.timer is None:
             self.sound.play()
@@ -4,7 +4,7 @@ from .. import tools, prepare
 from . import equips
 
 
-ITEM_SHEET = prepare.GFX["objects"]["items"]
+ITEM_SHEET = "items"
 
 ITEM_COORDS = {"heart" : [(0,0), (1,0)],
                "diamond" : [(0,1), (1,1)],
@@ -26,28 +26,21 @@ class _Item(pg.sprite.Sprite):
         player's identifiers attribute.
         """
         pg.sprite.Sprite.__init__(self, *groups)
-        coords, size = ITEM_COORDS[name], prepare.CELL_SIZE
-        self.frames = tools.strip_coords_from_sheet(ITEM_SHEET, coords, size)
+        coords = ITEM_COORDS[name]
+        self.frames = prepare.get_frames("objects", ITEM_SHEET, coords)
         self.anim = tools.Anim(self.frames, 7)
-        self.image = self.anim.get_next_frame(pg.time.get_ticks())
+        self.image = self.anim.get_next_frame(tools.get_ticks())
         #Subtract 1 from y axis to make item drop appear behind death anim.
         self.rect = pg.Rect((pos[0],pos[1]-1), prepare.CELL_SIZE)
         self.exact_position = list(self.rect.topleft)
         self.old_position = self.exact_position[:]
-        self.mask = pg.Mask(prepare.CELL_SIZE)
-        self.mask.fill()
+        self.mask = prepare.get_solid_mask()
         self.timer = tools.Timer(duration*1000, 1) if duration else None
         self.from_chest = chest
         self.identifier = ident  #Used to stop respawning of unique items.
         self.height = 0  #Used when item rises from chest.
         self.sound_effect = None
 
-    @property
-    def frame_speed(self):
-        """Get the total amount the object has been displaced this frame."""
-        return (self.exact_position[0]-self.old_position[0],
-                self.exact_position[1]-self.old_position[1])
-
     def collide_with_player(self, player):
         """
         Objects that aren't inside treasure chests bestow their effects and
@@ -77,7 +70,7 @@ class _Item(pg.sprite.Sprite):
         If the item came from a chest animate it rising appropriately;
         Get next frame of animation.
         """
-        self.old_position = self.exact_position[:]
+        self.old_position[:] = self.exact_position
         if self.timer:
             self.timer.check_tick(now)
             if self.timer.done:
@@ -153,8 +146,7 @@ def make_equip_drop(GearClass):
             self.rect = pg.Rect((pos[0],pos[1]-1), prepare.CELL_SIZE)
             self.exact_position = list(self.rect.topleft)
             self.old_position = self.exact_position[:]
-            self.mask = pg.Mask(prepare.CELL_SIZE)
-            self.mask.fill()
+            self.mask = prepare.get_solid_mask()
             self.timer = None
             self.from_chest = chest
             self.identifier = ident  #Used to stop respawning of unique items.
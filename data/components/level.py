@@ -1,22 +1,32 @@
 import os
-import sys
 import pygame as pg
 
 from operator import attrgetter
-from .. import prepare, tools
-from . import enemy_sprites, item_sprites
-
-
-if sys.version_info[0] < 3:
-    import yaml
-else:
-    import yaml3 as yaml
+from .. import prepare, tools, map_cache, profiler
+from . import enemy_sprites, enemy_batch, item_sprites, collision, render_queue
 
 
 LAYERS = ("BG Colors", "BG Tiles", "Water", "Solid",
           "Solid/Fore", "Foreground", "Environment",
           "Enemies", "Items", "Chests", "Push", "Portal")
 
+#Set to False to draw every tile as an individual sprite each frame.
+PRERENDER_STATIC_TILES = True
+
+#Move walking enemies together in an enemy_batch.EnemyBatch (needs NumPy;
+#ignored without it).  Worthwhile for maps with very many enemies.
+BATCH_ENEMIES = False
+
+#Tile layers whose static tiles are pre-rendered together.  Each run of
+#layers has no other draw layer (shadows, actors) between them.  The first
+#run lies below everything else and is rendered directly to the background.
+PRERENDER_RUNS = (("BG Tiles", "Water"),
+                  ("Solid",),
+                  ("Solid/Fore", "Foreground"))
+#Size of the screen areas whose static tiles share a StaticLayer.  Each layer
+#only covers its tiles, so sparse runs do not cost full screen surfaces.
+STATIC_CHUNK_SIZE = (200, 100)
+
 
 class CollisionRect(pg.sprite.Sprite):
     """A rect that can be used as a sprite for collision purposes."""
@@ -30,10 +40,10 @@ class Tile(tools._BaseSprite):
     def __init__(self, sheet, source, target, mask):
         """If the player can collide with it pass mask=True."""
         tools._BaseSprite.__init__(self, target, prepare.CELL_SIZE)
-        self.sheet = prepare.GFX["mapsheets"][sheet]
-        self.image = self.sheet.subsurface(pg.Rect(source, prepare.CELL_SIZE))
+        self.sheet = sheet
+        self.image = prepare.get_cell("mapsheets", sheet, source)
         if mask:
-            self.mask = pg.mask.from_surface(self.image)
+            self.mask = prepare.get_mask("mapsheets", sheet, source)
 
     def collide_with_player(self, player):
         """
@@ -61,12 +71,12 @@ class PushBlock(Tile):
         '1110' would mean the block could be pushed in all directions except
         for West).
         """
-        Tile.__init__(self, sheet, source, target, True)
+        Tile.__init__(self, sheet, source, target, False)
         self.pushable = self.set_pushable_directions(pushable)
         self.stack_height = stack_height
         self.linked = None
         self.post_event = post_event
-        self.mask.fill() #Solid block masks for pushblocks avoid problems.
+        self.mask = prepare.get_solid_mask() #Solid masks avoid problems.
         self.event_key = event_key
         self.start_rect = self.rect.copy()
         self.offset = [0,0]
@@ -162,7 +172,7 @@ class PushBlock(Tile):
             current = self.rect
             for sprite in ordered:
                 sprite.rect.bottomleft = current.topleft
-                sprite.exact_position = list(sprite.rect.topleft)
+                sprite.exact_position[:] = sprite.rect.topleft
                 current = sprite.rect
 
     def pushing(self):
@@ -198,8 +208,10 @@ class AnimatedTile(Tile):
         are the same.
         """
         Tile.__init__(self, "animsheet", src, target, mask)
-        size = prepare.CELL_SIZE
-        frames = tools.strip_from_sheet(self.sheet, src, size, frames)
+        width = prepare.CELL_SIZE[0]
+        locations = [(src[0]+width*i, src[1]) for i in range(frames)]
+        frames = [prepare.get_cell("mapsheets", self.sheet, location)
+                  for location in locations]
         self.anim = tools.Anim(frames, fps)
 
     def update(self, now, *args):
@@ -244,8 +256,8 @@ class TreasureChest(Tile):
         self.item = item
         self.map_name, self.key = map_name, key
         self.open = False
-        self.open_image = self.sheet.subsurface(((50,0), prepare.CELL_SIZE))
-        self.open_mask = pg.mask.from_surface(self.open_image)
+        self.open_image = prepare.get_cell("mapsheets", self.sheet, (50,0))
+        self.open_mask = prepare.get_mask("mapsheets", self.sheet, (50,0))
         self.add_to_map = False
 
     def check_opened(self, player):
@@ -274,6 +286,7 @@ class TreasureChest(Tile):
             item = item_sprites.ITEMS[self.item](self.rect, None, True,
                                     (self.map_name, self.key), *item_groups)
             item.get_item(player)
+            player.checkpoint = True
             self.add_to_map = False
 
     def interact_with(self, player):
@@ -286,12 +299,38 @@ class TreasureChest(Tile):
             self.add_to_map = True
 
 
+class StaticLayer(pg.sprite.Sprite):
+    """
+    A single image containing pre-rendered tiles.  Drawn in place of the
+    individual tile sprites, which remain in their groups for collision.
+    The image only covers the bounding rect of the tiles (clipped to an
+    area of size), so a few tiles do not cost a full screen of pixels.
+    """
+    def __init__(self, tiles, size=prepare.PLAY_RECT.size):
+        pg.sprite.Sprite.__init__(self)
+        bounds = pg.Rect((0,0), size)
+        self.rect = tiles[0].rect.unionall([tile.rect for tile in tiles])
+        self.rect = self.rect.clip(bounds)
+        self.image = pg.Surface(self.rect.size).convert_alpha()
+        self.image.fill((0,0,0,0))
+        offset = -self.rect.x, -self.rect.y
+        filled = set()
+        for tile in tiles:
+            target = tile.rect.move(offset)
+            if tile.rect.topleft in filled:
+                self.image.blit(tile.image, target)
+            else:
+                #Copy exactly; alpha blending onto a clear pixel darkens it.
+                flags = pg.BLEND_RGBA_MAX
+                self.image.blit(tile.image, target, special_flags=flags)
+                filled.add(tile.rect.topleft)
+
+
 class PortalTile(pg.sprite.Sprite):
     def __init__(self, target, world, map_coords, start_coords, *groups):
         pg.sprite.Sprite.__init__(self, *groups)
         self.rect = pg.Rect(target, (50, 50))
-        self.mask = pg.mask.Mask((50,50))
-        self.mask.fill()
+        self.mask = prepare.get_solid_mask()
         self.world = world
         self.map_coords = map_coords
         self.start_coords = start_coords
@@ -333,23 +372,73 @@ SPECIAL_TILES = {
     ("base", (300, 450)) : (HazardTile, {"dmg" : 1})}
 
 
+def load_map(map_name):
+    """
+    Load the map data from a resource file.  The precompiled map cache is
+    used when it is current; see map_cache.load.  This function does not
+    touch pygame, so it is safe to call from a worker thread.
+    """
+    path = os.path.join(map_cache.MAP_DIRECTORY, map_name)
+    map_dict = {layer:{} for layer in LAYERS}
+    map_dict.update(map_cache.load(path))
+    return map_dict
+
+
+def merge_rects(rects, bounds):
+    """
+    Clip rects to bounds and merge any that overlap, returning a list of
+    non-overlapping rects covering the same area (or slightly more).
+    """
+    merged = []
+    for rect in rects:
+        rect = rect.clip(bounds)
+        if not rect.w or not rect.h:
+            continue
+        index = rect.collidelist(merged)
+        while index != -1:
+            rect.union_ip(merged.pop(index))
+            index = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+
 class Level(object):
     """Class representing an individual map."""
-    def __init__(self, player, map_name):
+    def __init__(self, player, map_name, map_dict=None, staged=False):
+        """
+        If the map data has already been loaded it may be passed as map_dict.
+        Pass staged=True to defer construction; the level is then built one
+        stage at a time through build_step (used when prefetching neighboring
+        maps so that the work is spread across several frames).
+        """
         self.player = player
         self.name = map_name
-        self.map_dict = self.load_map(map_name)
+        self.drawn = None #Sprite states from the last draw_dirty call.
+        self.draw_rects = {} #Moving sprites to their interpolated rects.
+        self.built = False
+        self.builder = self.build(map_dict)
+        if not staged:
+            self.finish()
+
+    def build(self, map_dict):
+        """
+        Generator that constructs the level, yielding between each of the
+        more expensive stages.
+        """
+        self.map_dict = map_dict if map_dict else self.load_map(self.name)
         self.background = self.make_background()
+        yield
         self.enemies = pg.sprite.Group()
         self.items = pg.sprite.Group()
         self.main_sprites = pg.sprite.Group(self.player)
         self.moving = pg.sprite.Group(self.player)
         self.all_group, self.solids, foreground = self.make_all_layer_groups()
+        yield
         self.borders = self.make_borders()
-        self.solid_border = pg.sprite.Group(self.solids, self.borders)
+        self.solid_border = collision.CollisionGrid(self.solids, self.borders)
         self.interactables = pg.sprite.Group() ###
         self.projectiles = pg.sprite.Group()
-        self.portals = pg.sprite.Group()
+        self.portals = collision.CollisionGrid()
         self.group_dict = {"borders" : self.borders,
                            "solid_border" : self.solid_border,
                            "foreground" : foreground,
@@ -363,10 +452,44 @@ class Level(object):
         self.all_group.add(self.player)
         self.spawn()
         self.shadows = self.make_shadows()
+        yield
         self.posted = set() # Set of map events that have been posted.
         self.make_chests()
         self.make_push()
         self.make_portal()
+        self.walkable = self.make_walkable()
+        self.sort_sprites()
+
+    def build_step(self):
+        """
+        Perform the next stage of construction.  Returns True once the level
+        is completely built.
+        """
+        if not self.built:
+            try:
+                next(self.builder)
+            except StopIteration:
+                self.built = True
+                self.builder = None
+        return self.built
+
+    def finish(self):
+        """Complete any remaining construction immediately."""
+        while not self.build_step():
+            pass
+
+    def discard(self):
+        """
+        Called when the level will no longer be used.  The player is removed
+        from the level's groups; otherwise the player would keep the groups
+        (and every sprite in them) alive.
+        """
+        self.builder = None
+        self.draw_rects.clear()
+        for name in ("main_sprites", "moving", "all_group"):
+            group = getattr(self, name, None)
+            if group:
+                self.player.remove(group)
 
     def make_push(self):
         """Create all push blocks."""
@@ -378,7 +501,20 @@ class Level(object):
             self.all_group.add(push, layer=prepare.Z_ORDER["Solid"])
             groups = (self.solids, self.solid_border, self.moving)
             push.add(*groups)
+            self.solids.track(push)
+            self.solid_border.track(push)
             
+    def make_walkable(self):
+        """
+        Create the grid of cells enemies may walk into.  Everything in
+        solid_border blocks a cell; push blocks are tracked as they move.
+        """
+        walkable = collision.WalkabilityGrid(self.solid_border)
+        push_blocks = [s for s in self.solids if isinstance(s, PushBlock)]
+        walkable.track(*push_blocks)
+        self.group_dict["walkable"] = walkable
+        return walkable
+
     def make_portal(self):
         """Create all portals."""
         for target in self.map_dict["Portal"]:
@@ -416,11 +552,19 @@ class Level(object):
                 item_sprites.ITEMS[item](*args)
 
     def spawn(self):
-        """Create enemies, adding them to the required groups."""
+        """
+        Create enemies, adding them to the required groups (and the enemy
+        batch if enabled).
+        """
+        self.enemy_batch = None
+        if BATCH_ENEMIES and enemy_batch.np is not None:
+            self.enemy_batch = enemy_batch.EnemyBatch()
         groups = (self.enemies, self.main_sprites, self.moving, self.all_group)
         for target in self.map_dict["Enemies"]:
             sheet, source, speed = self.map_dict["Enemies"][target]
-            enemy_sprites.ENEMY_DICT[source](target, speed, *groups)
+            enemy = enemy_sprites.ENEMY_DICT[source](target, speed, *groups)
+            if self.enemy_batch and enemy.batchable:
+                self.enemy_batch.add(enemy)
 
     def make_shadows(self):
         """Create shadows for the player and all enemies."""
@@ -446,11 +590,7 @@ class Level(object):
 
     def load_map(self, map_name):
         """Load the map data from a resource file."""
-        path = os.path.join(".", "resources", "map_data", map_name)
-        map_dict = {layer:{} for layer in LAYERS}
-        with open(path) as myfile:
-            map_dict.update(yaml.load(myfile))
-        return map_dict
+        return load_map(map_name)
 
     def make_background(self):
         """Create the background as one big surface."""
@@ -464,18 +604,83 @@ class Level(object):
         return background
 
     def make_all_layer_groups(self):
-        """Create sprite groups for all layers."""
-        all_group = pg.sprite.LayeredUpdates()
-        solid_group = pg.sprite.Group()
-        layer = "BG Tiles"
-        all_group.add(self.make_tile_group(layer), layer=prepare.Z_ORDER[layer])
-        foreground = self.make_tile_group("Foreground")
-        all_group.add(foreground, layer=prepare.Z_ORDER["Foreground"])
+        """
+        Create sprite groups for all layers.  If PRERENDER_STATIC_TILES is
+        set, static tiles are baked into the background or a StaticLayer and
+        only the remaining tiles are added to the draw group.
+        """
+        all_group = render_queue.RenderQueue()
+        solid_group = collision.CollisionGrid()
+        layers = {"BG Tiles" : self.make_tile_group("BG Tiles"),
+                  "Foreground" : self.make_tile_group("Foreground")}
         for layer in ("Solid/Fore", "Solid", "Water"):
-            solids = self.make_tile_group(layer, True)
-            all_group.add(solids, layer=prepare.Z_ORDER[layer])
-            solid_group.add(solids)
-        return all_group, solid_group, foreground
+            layers[layer] = self.make_tile_group(layer, True)
+            solid_group.add(layers[layer])
+        if PRERENDER_STATIC_TILES:
+            drawn = self.prerender_static_tiles(layers)
+        else:
+            drawn = layers
+        for layer in drawn:
+            all_group.add(drawn[layer], layer=prepare.Z_ORDER[layer])
+        return all_group, solid_group, layers["Foreground"]
+
+    def prerender_static_tiles(self, layers):
+        """
+        Render the static tiles of each run in PRERENDER_RUNS to a single
+        surface and return a dict of the sprites that still need drawing for
+        each layer.  A static tile is left as a sprite if a dynamic tile from
+        an earlier layer of its run occupies the same cell, so that the
+        original draw order is kept.
+        """
+        stacked = self.get_stacked_cells()
+        drawn = {}
+        for i,run in enumerate(PRERENDER_RUNS):
+            dynamic_cells = set()
+            static = []
+            for layer in run:
+                drawn[layer] = []
+                for tile in layers[layer]:
+                    cell = tile.rect.topleft
+                    linked = layer == "Foreground" and cell in stacked
+                    if (isinstance(tile, AnimatedTile) or linked or
+                            cell in dynamic_cells):
+                        drawn[layer].append(tile)
+                        dynamic_cells.add(cell)
+                    else:
+                        static.append(tile)
+            if not i:
+                for tile in static:
+                    self.background.blit(tile.image, tile.rect)
+            else:
+                drawn[run[0]][:0] = self.make_static_layers(static)
+        return drawn
+
+    def make_static_layers(self, tiles):
+        """
+        Return a list of StaticLayers for tiles, one for each chunk of the
+        screen (see STATIC_CHUNK_SIZE) that holds any of them.  Tiles are
+        assigned to a chunk by their cell so tiles sharing a cell are always
+        rendered together and in order.
+        """
+        chunks = {}
+        width, height = STATIC_CHUNK_SIZE
+        for tile in tiles:
+            chunk = tile.rect.x//width, tile.rect.y//height
+            chunks.setdefault(chunk, []).append(tile)
+        return [StaticLayer(chunks[chunk]) for chunk in sorted(chunks)]
+
+    def get_stacked_cells(self):
+        """
+        Return the set of cells that may hold tiles stacked on push blocks.
+        These tiles move with their block so can not be pre-rendered.
+        """
+        cells = set()
+        for target in self.map_dict["Push"]:
+            data = self.map_dict["Push"][target]
+            stack_height = data[3] if len(data) > 3 else 2
+            for i in range(1, stack_height+1):
+                cells.add((target[0], target[1]-prepare.CELL_SIZE[1]*i))
+        return cells
 
     def make_tile_group(self, layer, mask=False):
         """
@@ -507,25 +712,43 @@ class Level(object):
                 self.add_map_item(event)
                 ### Check map changes here too.
 
+    @profiler.timed("Level.update")
     def update(self, now):
         """
         Update all sprites; check any collisions that may have occured;
         and finally sort the main_sprite group by y coordinate.
         """
+        if self.enemy_batch:
+            self.enemy_batch.step()
         self.all_group.update(now, self.player, self.group_dict)
         if not self.enemies:
             self.post_map_event("kill")
         self.check_collisions()
+        self.sort_sprites()
+        profiler.PROFILER.count_groups(self.group_dict)
+
+    def sort_sprites(self):
+        """
+        Set the draw layer of each main sprite to its y coordinate.  This is
+        done in update rather than draw because it also changes the order in
+        which sprites are updated; the simulation must not depend on drawing.
+        """
+        self.all_group.sort_actors(self.main_sprites)
 
+    @profiler.timed("check_collisions")
     def check_collisions(self):
         """
         Check collisions and call the appropriate functions of the affected
-        sprites.
+        sprites.  The static solids and portals are CollisionGrids, so only
+        those near the player are tested; the moving groups are tested in
+        full (see collision.CollisionGrid).
         """
         callback = tools.rect_then_mask
-        groups = pg.sprite.Group(self.solids, self.enemies,
-                                 self.items, self.projectiles, self.portals)
-        hits = pg.sprite.spritecollide(self.player, groups, False, callback)
+        player = self.player
+        hits = self.solids.collide(player, callback)
+        for group in (self.enemies, self.items, self.projectiles):
+            hits.extend(pg.sprite.spritecollide(player, group, 0, callback))
+        hits.extend(self.portals.collide(player, callback))
         for hit in hits:
             hit.collide_with_player(self.player)
         self.process_attacks()
@@ -538,16 +761,87 @@ class Level(object):
                 enemy.got_hit(self.player, self.solid_border, self.items,
                               self.main_sprites, self.all_group)
 
+    def position_sprites(self, interpolate):
+        """
+        Place the draw rect of each moving sprite the fraction interpolate
+        of its last displacement beyond its rect.  Draw rects are kept in
+        draw_rects and reused every frame; the rects used by the simulation
+        are never changed by drawing.
+        """
+        draw_rects = self.draw_rects
+        for sprite in set(draw_rects).difference(self.moving):
+            del draw_rects[sprite]
+        for sprite in self.moving:
+            rect = draw_rects.get(sprite)
+            if rect is None:
+                rect = draw_rects[sprite] = sprite.rect.copy()
+            else:
+                rect[:] = sprite.rect
+            exact, old = sprite.exact_position, sprite.old_position
+            rect.x += int((exact[0]-old[0])*interpolate)
+            rect.y += int((exact[1]-old[1])*interpolate)
+
+    def get_draw_rect(self, sprite):
+        """Return the rect sprite is drawn at (see position_sprites)."""
+        return self.draw_rects.get(sprite, sprite.rect)
+
+    @profiler.timed("Level.draw")
     def draw(self, surface, interpolate):
         """Draw all sprites and layers to the surface."""
         surface.blit(self.background, (0,0))
-        for sprite in self.moving:
-            interpolated = (sprite.frame_speed[0]*interpolate,
-                            sprite.frame_speed[1]*interpolate)
-            sprite.rect.move_ip(*interpolated)
-        for sprite in self.main_sprites:
-            self.all_group.change_layer(sprite, sprite.rect.centery)
-        self.all_group.draw(surface)
+        self.position_sprites(interpolate)
+        draw_rects = self.draw_rects
+        for sprite in self.all_group.sprites():
+            surface.blit(sprite.image, draw_rects.get(sprite, sprite.rect))
+
+    @profiler.timed("Level.draw")
+    def draw_dirty(self, surface, interpolate, full=False):
+        """
+        Redraw only the areas of the surface where a sprite has moved or
+        changed image since the last call, and return a list of those rects.
+        If full is True (or nothing has been drawn yet) the whole level is
+        drawn.  The surface must not have been drawn over by anything else
+        since the previous call unless full is passed.
+        """
+        if full or self.drawn is None:
+            self.draw(surface, interpolate)
+            self.drawn = self.get_drawn_state()
+            return [prepare.PLAY_RECT.copy()]
+        self.position_sprites(interpolate)
+        drawn = self.get_drawn_state()
+        dirty = []
+        for sprite,state in drawn.items():
+            previous = self.drawn.pop(sprite, None)
+            if previous != state:
+                dirty.append(state[0])
+                if previous:
+                    dirty.append(previous[0])
+        dirty.extend(state[0] for state in self.drawn.values())
+        self.drawn = drawn
+        dirty = merge_rects(dirty, prepare.PLAY_RECT)
+        sprites = self.all_group.sprites()
+        draw_rects = self.draw_rects
+        for rect in dirty:
+            surface.set_clip(rect)
+            surface.blit(self.background, rect, rect)
+            for sprite in sprites:
+                sprite_rect = draw_rects.get(sprite, sprite.rect)
+                if sprite_rect.colliderect(rect):
+                    surface.blit(sprite.image, sprite_rect)
+        surface.set_clip(None)
+        return dirty
+
+    def get_drawn_state(self):
+        """
+        Return a dict of each drawn sprite's draw rect and image (StaticLayers
+        never change so they are skipped).
+        """
+        drawn = {}
+        for sprite in self.all_group:
+            if not isinstance(sprite, StaticLayer):
+                drawn[sprite] = (self.get_draw_rect(sprite).copy(),
+                                 sprite.image)
+        return drawn
 
     def on_map_change(self):
         groups = pg.sprite.Group(self.group_dict["projectiles"],
@@ -0,0 +1,155 @@
+"""
+Contains a least recently used cache for built levels.  Levels are keyed by
+(world, map_name) and evicted once the estimated memory of all cached levels
+exceeds a byte budget.  Levels held elsewhere (prefetched neighbors) can be
+counted against the same budget with reserve.  The cache is owned by the Game state so that levels
+survive changes of world (portal round trips do not rebuild every map).
+"""
+
+from collections import OrderedDict
+
+from .. import tools
+
+
+DEFAULT_BUDGET = 24*1024*1024 #Bytes.
+SPRITE_OVERHEAD = 512 #Rough per sprite cost of the object and its rect.
+
+
+def surface_size(surface):
+    """
+    Estimated bytes owned by a surface.  Subsurfaces share their parent's
+    pixels so they are counted as free.
+    """
+    if surface is None or surface.get_parent() is not None:
+        return 0
+    width, height = surface.get_size()
+    return width*height*surface.get_bytesize()
+
+
+def mask_size(mask):
+    """Estimated bytes used by a collision mask (one bit per pixel)."""
+    if mask is None:
+        return 0
+    width, height = mask.get_size()
+    return width*height//8
+
+
+def anim_size(anims):
+    """Estimated bytes owned by the frames of an animation dictionary."""
+    if isinstance(anims, tools.Anim):
+        return sum(surface_size(frame) for frame in anims.frames)
+    elif isinstance(anims, dict):
+        return sum(anim_size(anim) for anim in anims.values())
+    return 0
+
+
+def estimate_level_size(level):
+    """
+    Estimate the memory held by a level from its background, the images,
+    masks and animation frames of its sprites (including the StaticLayers of
+    pre-rendered tiles), and a fixed per sprite cost.  Sprites shared with
+    the player are not counted.
+    """
+    player = level.player
+    shared = {player, player.shadow, player.equipped["weapon"].sprite}
+    sprites = set(level.all_group)
+    sprites.update(level.solids, level.portals, level.borders)
+    total = surface_size(level.background)
+    for sprite in sprites-shared:
+        total += SPRITE_OVERHEAD
+        total += surface_size(getattr(sprite, "image", None))
+        total += mask_size(getattr(sprite, "mask", None))
+        total += anim_size(getattr(sprite, "anims", None))
+    return total
+
+
+class LevelCache(object):
+    """
+    A least recently used cache of levels with a memory budget.  Counters of
+    hits, misses and evictions are kept for diagnostics.
+    """
+    def __init__(self, budget=DEFAULT_BUDGET):
+        self.budget = budget
+        self.levels = OrderedDict()
+        self.sizes = {}
+        self.used = 0
+        self.reserved = 0 #Bytes of levels held outside the cache.
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        """Membership test; does not count as a use."""
+        return key in self.levels
+
+    def __len__(self):
+        return len(self.levels)
+
+    def get(self, key):
+        """
+        Return the level stored for key (marking it most recently used), or
+        None if it is not cached.
+        """
+        try:
+            level = self.levels.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self.levels[key] = level
+        self.hits += 1
+        return level
+
+    def put(self, key, level):
+        """
+        Store level as the most recently used entry and evict older levels
+        until the cache is back within budget.  The newest level is never
+        evicted, even if it alone exceeds the budget.
+        """
+        if key in self.levels:
+            self.remove(key)
+        self.levels[key] = level
+        self.sizes[key] = estimate_level_size(level)
+        self.used += self.sizes[key]
+        self.trim()
+
+    def reserve(self, size):
+        """
+        Set the bytes of levels held outside the cache that count against
+        the budget, evicting cached levels if it is now exceeded.
+        """
+        self.reserved = size
+        self.trim()
+
+    def trim(self):
+        """
+        Evict the least recently used levels until the cached and reserved
+        bytes are within budget, keeping at least the newest level.
+        """
+        while (self.used+self.reserved > self.budget and
+               len(self.levels) > 1):
+            oldest = next(iter(self.levels))
+            self.remove(oldest).discard()
+            self.evictions += 1
+
+    def remove(self, key):
+        """Remove and return the level stored for key."""
+        self.used -= self.sizes.pop(key)
+        return self.levels.pop(key)
+
+    def clear(self):
+        """Discard every cached level."""
+        for level in self.levels.values():
+            level.discard()
+        self.levels.clear()
+        self.sizes.clear()
+        self.used = 0
+
+    def stats(self):
+        """Return a dictionary of the cache counters and memory use."""
+        return {"levels" : len(self.levels),
+                "used" : self.used,
+                "reserved" : self.reserved,
+                "budget" : self.budget,
+                "hits" : self.hits,
+                "misses" : self.misses,
+                "evictions" : self.evictions}
@@ -5,6 +5,8 @@ This module contains the primary class for the player.
 import random
 import pygame as pg
 
+from collections import OrderedDict
+
 from . import equips, shadow
 from .. import prepare, tools
 
@@ -24,6 +26,77 @@ HIT_ANIMATION_FPS = 20.0
 BASE_SPEED = 3
 KNOCK_SPEED = 12.5
 
+#Hit frames are drawn over HIT_BACKGROUND and brightened by adding a tint;
+#blue for the first frame of each animation and red for the others.
+HIT_BACKGROUND = (85, 0, 85)
+HIT_TINTS = [(0, 0, 150), (150, 0, 0)]
+#Use the old 8-bit palette method for hit frames (only needed if additive
+#blending is unavailable).
+PALETTE_HIT_IMAGES = not hasattr(pg, "BLEND_RGB_ADD")
+
+GEAR_ORDER = ("head", "body", "shield", "armleg", "weapon")
+#Frame sets kept by the animation cache (four are built per gear set).
+ANIMATION_CACHE_SIZE = 48
+
+
+class AnimationCache(object):
+    """
+    A least recently used cache of composited player frames.  Keys are
+    (gear, attack, hit) where gear is a tuple of the equipped gear names in
+    GEAR_ORDER; values map directions to frame lists.  Frames are shared by
+    every player wearing the same gear, so they must never be drawn on.
+    Counters of hits, misses and evictions are kept for diagnostics.
+    """
+    def __init__(self, size=ANIMATION_CACHE_SIZE):
+        self.size = size
+        self.frames = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.frames)
+
+    def get(self, key):
+        """
+        Return the frames stored for key (marking them most recently used),
+        or None if they are not cached.
+        """
+        try:
+            frames = self.frames.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self.frames[key] = frames
+        self.hits += 1
+        return frames
+
+    def put(self, key, frames):
+        """
+        Store frames as the most recently used entry, evicting the least
+        recently used entries beyond size.
+        """
+        self.frames.pop(key, None)
+        self.frames[key] = frames
+        while len(self.frames) > self.size:
+            self.frames.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Discard every cached frame set."""
+        self.frames.clear()
+
+    def stats(self):
+        """Return a dictionary of the cache counters."""
+        return {"entries" : len(self.frames),
+                "size" : self.size,
+                "hits" : self.hits,
+                "misses" : self.misses,
+                "evictions" : self.evictions}
+
+
+ANIMATION_CACHE = AnimationCache()
+
 
 class _ImageProcessing(object):
     """
@@ -35,16 +108,40 @@ class _ImageProcessing(object):
         """
         Returns a list of two dictionaries containing all animations.
         Index zero corresponds to normal frames; index one corresponds to
-        frames for taking damage.
+        frames for taking damage.  Frames for gear that has been worn
+        recently are reused from ANIMATION_CACHE.
         """
+        gear = tuple(getattr(self.equipped[part], "name", None)
+                     for part in GEAR_ORDER)
         standard = {}
-        standard["normal"] = self.make_images()
-        standard["attack"] = self.make_images(True, DRAW_ATTACK_ORDER)
         strobing = {}
-        strobing["normal"] = self.make_hit_images(standard["normal"])
-        strobing["attack"] = self.make_hit_images(standard["attack"])
+        for kind,attack in (("normal", False), ("attack", True)):
+            standard[kind] = self.get_animations(gear, attack, False)
+            strobing[kind] = self.get_animations(gear, attack, True)
         return [standard, strobing]
 
+    def get_animations(self, gear, attack, hit):
+        """
+        Return new Anims for a variant of the current gear, building its
+        frames if they are not in ANIMATION_CACHE.
+        """
+        key = (gear, attack, hit)
+        frames = ANIMATION_CACHE.get(key)
+        if frames is None:
+            if hit:
+                anims = self.get_animations(gear, attack, False)
+                anims = self.make_hit_images(anims)
+            elif attack:
+                anims = self.make_images(True, DRAW_ATTACK_ORDER)
+            else:
+                anims = self.make_images()
+            frames = {direction : anim.frames
+                      for direction,anim in anims.items()}
+            ANIMATION_CACHE.put(key, frames)
+        fps = HIT_ANIMATION_FPS if hit else STANDARD_ANIMATION_FPS
+        return {direction : tools.Anim(list(frames[direction]), fps)
+                for direction in frames}
+
     def make_death_animation(self):
         """Return a tools.Anim object with the player's death sequence."""
         sheet = prepare.GFX["enemies"]["enemysheet"]
@@ -79,14 +176,50 @@ class _ImageProcessing(object):
     def make_hit_images(self, from_dict):
         """
         Create a dictionary of red and blue versions of the player's animations
-        to use while getting hit.  Uses a messy 8-bit palette conversion.
+        to use while getting hit.  All frames are laid out on one sheet, a
+        column per frame index, and each column is tinted with a single
+        additive fill.  The frames are subsurfaces of the sheet.
+        """
+        if PALETTE_HIT_IMAGES:
+            return self.make_palette_hit_images(from_dict)
+        width, height = prepare.CELL_SIZE
+        directions = list(from_dict)
+        columns = max(len(from_dict[direction].frames)
+                      for direction in directions)
+        sheet = pg.Surface((width*columns, height*len(directions))).convert()
+        sheet.fill(HIT_BACKGROUND)
+        for row,direction in enumerate(directions):
+            for column,frame in enumerate(from_dict[direction].frames):
+                sheet.blit(frame, (width*column, height*row))
+        colorkeys = []
+        for column in range(columns):
+            tint = HIT_TINTS[bool(column)]
+            rect = pg.Rect(width*column, 0, width, sheet.get_height())
+            sheet.fill(tint, rect, special_flags=pg.BLEND_RGB_ADD)
+            colorkeys.append([min(a+b, 255)
+                              for a,b in zip(HIT_BACKGROUND, tint)])
+        anims = {}
+        for row,direction in enumerate(directions):
+            frames = []
+            for column in range(len(from_dict[direction].frames)):
+                rect = pg.Rect(width*column, height*row, width, height)
+                image = sheet.subsurface(rect)
+                image.set_colorkey(colorkeys[column])
+                frames.append(image)
+            anims[direction] = tools.Anim(frames, HIT_ANIMATION_FPS)
+        return anims
+
+    def make_palette_hit_images(self, from_dict):
+        """
+        Create the hit animations with a messy 8-bit palette conversion.
+        Used in place of make_hit_images if additive blending is unavailable.
         """
         anims = {}
         for direction in from_dict:
             frames = []
             for i,frame in enumerate(from_dict[direction].frames):
                 image = pg.Surface(prepare.CELL_SIZE)
-                image.fill((85,0,85))
+                image.fill(HIT_BACKGROUND)
                 image.blit(frame, (0,0))
                 image = image.convert(8)
                 palette = image.get_palette()
@@ -142,6 +275,7 @@ class Player(tools._BaseSprite, _ImageProcessing):
         self.death_anim = self.make_death_animation()
         self.image = None
         self.world_change = False
+        self.checkpoint = False #Set when progress should be autosaved.
         self.reset()
 
     def reset(self):
@@ -226,11 +360,8 @@ class Player(tools._BaseSprite, _ImageProcessing):
         return (defense, attack, BASE_SPEED+speed_mod)
 
     def make_mask(self):
-        """Create a collision mask for the player."""
-        temp = pg.Surface((prepare.CELL_SIZE)).convert_alpha()
-        temp.fill((0,0,0,0))
-        temp.fill(pg.Color("white"), (10,20,30,30))
-        return pg.mask.from_surface(temp)
+        """Return the (shared) collision mask for the player."""
+        return prepare.get_solid_mask(prepare.CELL_SIZE, (10,20,30,30))
 
     def add_direction(self, key):
         """Add a pressed direction key on the direction stack."""
@@ -249,7 +380,7 @@ class Player(tools._BaseSprite, _ImageProcessing):
 
     def collide_with_solid(self, cancel_knock=True):
         """Called from level when the player walks into a solid tile."""
-        self.exact_position = self.old_position[:]
+        self.exact_position[:] = self.old_position
         self.rect.topleft = self.exact_position
         if cancel_knock:
             self.knock_state = False
@@ -370,7 +501,7 @@ class Player(tools._BaseSprite, _ImageProcessing):
 
     def update(self, now, *args):
         """Updates our player appropriately every frame."""
-        self.old_position = self.exact_position[:]
+        self.old_position[:] = self.exact_position
         self.check_death()
         if self.action_state != "dead":
             self.check_states(now)
@@ -380,6 +511,7 @@ class Player(tools._BaseSprite, _ImageProcessing):
 
     def on_world_change(self, world, map_coords, start_coords):
         self.world_change = True
+        self.checkpoint = True
         self.world = world
         self.save_world_coords = map_coords
         self.start_coord = start_coords
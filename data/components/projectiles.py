@@ -6,6 +6,7 @@ from .. import prepare, tools
 
 
 SHOOT_SHEET = prepare.GFX["objects"]["projectiles"]
+FIREBALL_COORDS = [(2,5), (3,5)]
 
 
 ROTATE_DICT = {"right" : 0,
@@ -57,7 +58,7 @@ class Web(_Particle):
         self.done = False
 
     def update(self, now, player, group_dicts):
-        self.old_position = self.exact_position[:]
+        self.old_position[:] = self.exact_position
         self.exact_position[self.axis] = self.owner.exact_position[self.axis]
         move = self.speed*self.vec[not self.axis]
         self.exact_position[not self.axis] += move
@@ -112,9 +113,10 @@ class FireBall(_Particle):
         self.vec = None
         self.speed = 5
         self.attack = 5
-        self.frames = tools.strip_from_sheet(SHOOT_SHEET, (100,250), size, 2)
+        self.frames = prepare.get_frames("objects", "projectiles",
+                                         FIREBALL_COORDS)
         self.anim = tools.Anim(self.frames, 12)
-        self.image = self.anim.get_next_frame(pg.time.get_ticks())
+        self.image = self.anim.get_next_frame(tools.get_ticks())
         self.mask = pg.mask.from_surface(self.image)
 
     def get_vector(self, player):
@@ -126,7 +128,7 @@ class FireBall(_Particle):
         return (vec_x, vec_y)
 
     def update(self, now, player, group_dict):
-        self.old_position = self.exact_position[:]
+        self.old_position[:] = self.exact_position
         self.image = self.anim.get_next_frame(now)
         if not self.vec:
             self.vec = self.get_vector(player)
@@ -0,0 +1,37 @@
+"""
+Contains the layered sprite group that orders a level's sprites for drawing
+(and updating).  Tiles, shadows and projectiles keep fixed layers; actors
+(the player, enemies and items) are layered by the y coordinate of their
+rect's center so that lower sprites are drawn in front.
+"""
+
+import pygame as pg
+
+
+class RenderQueue(pg.sprite.LayeredUpdates):
+    """
+    A LayeredUpdates group that re-sorts its actors in a single pass.
+    Calling change_layer for each actor removes and reinserts it in the
+    sprite list, which is quadratic in the number of sprites; sort_actors
+    gives the same order with one stable sort.  As the order barely changes
+    between updates the list is nearly sorted, which the sort handles in
+    close to linear time.
+    """
+    def sort_actors(self, actors):
+        """
+        Set the layer of every sprite in actors (which must all be in the
+        group) to its rect's centery.  The resulting order is the same as
+        calling change_layer for each actor in turn: sprites are ordered by
+        layer; an actor follows any other sprite on its layer, and actors on
+        the same layer keep the order of actors.
+        """
+        layers = self._spritelayers
+        ranks = {}
+        for rank,sprite in enumerate(actors, 1):
+            layer = sprite.rect.centery
+            layers[sprite] = layer
+            if hasattr(sprite, "_layer"):
+                sprite._layer = layer
+            ranks[sprite] = rank
+        self._spritelist.sort(key=lambda sprite: (layers[sprite],
+                                                  ranks.get(sprite, 0)))
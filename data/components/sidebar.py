@@ -1,6 +1,6 @@
 import pygame as pg
 
-from .. import prepare, tools
+from .. import prepare, tools, profiler
 
 
 SIDEBAR_SIZE = (200, 700)
@@ -27,6 +27,8 @@ class SideBar(object):
         self.rect = self.image.get_rect(x=1000)
         self.cells = self.get_health_cells()
         self.stats = {"money" : (None,None), "keys" : (None,None)}
+        self.rendered = None #Player values the image was last rendered with.
+        self.dirty = True
 
     def get_health_cells(self):
         """
@@ -78,8 +80,19 @@ class SideBar(object):
         primary = display_image.get_rect(center=PRIMARY_EQUIP.center)
         self.image.blit(display_image, primary)
 
+    @profiler.timed("SideBar.update")
     def update(self, player):
-        """Update and redraw all elements to the image."""
+        """
+        Redraw all elements to the image if any displayed value has changed
+        since the last render.
+        """
+        rendered = (player.health, player.inventory["money"],
+                    player.inventory["keys"],
+                    player.equipped["weapon"].display)
+        if rendered == self.rendered:
+            return
+        self.rendered = rendered
+        self.dirty = True
         self.image.fill(prepare.BACKGROUND_COLOR)
         self.image.blit(prepare.GFX["misc"]["sidebargfx"], (0,0))
         self.render_health(player)
@@ -89,3 +102,14 @@ class SideBar(object):
     def draw(self, surface, offset=0):
         """Standard draw function."""
         surface.blit(self.image, (self.rect.x+offset, self.rect.y))
+
+    def draw_dirty(self, surface, full=False):
+        """
+        Draw the HUD only if it has changed since it was last drawn (or if
+        full is True).  Return a list of the rects updated.
+        """
+        if not (self.dirty or full):
+            return []
+        self.draw(surface)
+        self.dirty = False
+        return [self.rect.copy()]
@@ -1,20 +1,26 @@
 import os
-import sys
+import threading
 import pygame as pg
 
-from .. import prepare, tools
-from . import level
+from .. import prepare, tools, yaml_loader
+from . import level, level_cache
 
 
-if sys.version_info[0] < 3:
-    import yaml
-else:
-    import yaml3 as yaml
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 
-MAX_HISTORY = 3
 OFFSCREEN_THRESHOLD = 25 #Amount player can be offscreen before map scrolls.
 SCROLL_SPEED = 20.0
+PREFETCH_STEPS_PER_UPDATE = 1 #Level build stages finalized per update.
+#Load prefetched map data on a worker thread.  Set to False to load it on the
+#main thread instead, which makes prefetching deterministic (for replays).
+THREADED_PREFETCH = True
+#Advance map scrolls at most once per drawn frame.  When False scrolls advance
+#every update, so that the simulation does not depend on drawing.
+SCROLL_PER_FRAME = True
 
 
 class MapError(Exception):
@@ -22,47 +28,200 @@ class MapError(Exception):
     pass
 
 
+class LevelPrefetcher(object):
+    """
+    Warms levels for maps that the player is likely to enter next.  Map data
+    is loaded and parsed on a worker thread; the resulting data is then built
+    into a Level on the main thread (where Surfaces may safely be created) a
+    stage at a time, so that no single update carries the whole cost.
+    If threaded is False map data is loaded immediately on request instead.
+    Built levels are counted against the budget of cache (a LevelCache) while
+    they are held here.
+    """
+    def __init__(self, player, cache, threaded=True):
+        self.player = player
+        self.cache = cache
+        self.requests = queue.Queue()
+        self.loaded = queue.Queue()
+        self.wanted = set()
+        self.levels = {}  #Map name to (possibly partially built) Level.
+        self.sizes = {} #Map name to estimated bytes of each built Level.
+        self.worker = None
+        if threaded:
+            self.worker = threading.Thread(target=self.load_worker)
+            self.worker.daemon = True
+            self.worker.start()
+
+    def load_worker(self):
+        """
+        Worker thread loop.  Load requested maps until a None request is
+        received.  Maps that fail to load are skipped here; the error will
+        surface when the map is built synchronously instead.
+        """
+        while True:
+            map_name = self.requests.get()
+            if map_name is None:
+                break
+            self.load(map_name)
+
+    def load(self, map_name):
+        """
+        Load the data for map_name and queue it for collection.  Any error
+        drops the request, so that one bad map does not stop the worker.
+        """
+        try:
+            self.loaded.put((map_name, level.load_map(map_name)))
+        except Exception:
+            pass
+
+    def prefetch(self, map_names):
+        """
+        Set the maps that should be prefetched (requested in the order
+        given).  Levels for maps no longer wanted are discarded.
+        """
+        for map_name in map_names:
+            if map_name not in self.wanted:
+                if self.worker:
+                    self.requests.put(map_name)
+                else:
+                    self.load(map_name)
+        map_names = set(map_names)
+        for map_name in self.wanted-map_names:
+            discarded = self.levels.pop(map_name, None)
+            if discarded:
+                discarded.discard()
+            self.sizes.pop(map_name, None)
+        self.wanted = map_names
+        self.reserve()
+
+    def reserve(self):
+        """Count the built levels held here against the cache's budget."""
+        self.cache.reserve(sum(self.sizes.values()))
+
+    def collect(self):
+        """Create staged levels for any map data the worker has finished."""
+        while True:
+            try:
+                map_name, map_dict = self.loaded.get_nowait()
+            except queue.Empty:
+                return
+            if map_name in self.wanted and map_name not in self.levels:
+                args = (self.player, map_name, map_dict, True)
+                self.levels[map_name] = level.Level(*args)
+
+    def update(self):
+        """
+        Collect newly loaded map data and advance the construction of
+        unfinished levels by PREFETCH_STEPS_PER_UPDATE stages.
+        """
+        self.collect()
+        steps = PREFETCH_STEPS_PER_UPDATE
+        for map_name,prefetched in self.levels.items():
+            while steps and not prefetched.built:
+                if prefetched.build_step():
+                    size = level_cache.estimate_level_size(prefetched)
+                    self.sizes[map_name] = size
+                    self.reserve()
+                steps -= 1
+            if not steps:
+                break
+
+    def take(self, map_name):
+        """
+        Return the prefetched level for map_name, finishing any construction
+        still outstanding.  Returns None if the map has not been loaded yet.
+        """
+        self.collect()
+        self.wanted.discard(map_name)
+        next_level = self.levels.pop(map_name, None)
+        if next_level:
+            next_level.finish()
+        if self.sizes.pop(map_name, None) is not None:
+            self.reserve()
+        return next_level
+
+    def close(self):
+        """Stop the worker thread and discard all prefetched levels."""
+        self.requests.put(None)
+        for prefetched in self.levels.values():
+            prefetched.discard()
+        self.levels = {}
+        self.sizes = {}
+        self.wanted = set()
+        self.reserve()
+
+
 class WorldMap(object):
     """
     Class for functionality of a series of connected maps.  Each area of the
     game is implemented as a WorldMap (overworld, dungeons, houses, etc.).
     """
-    def __init__(self, player):
+    def __init__(self, player, cache=None):
+        """
+        The cache argument is a level_cache.LevelCache; passing the same
+        cache to successive WorldMaps lets levels persist across worlds.
+        """
         self.player = player
         self.name = self.player.world
         self.world_dict = self.load(self.name)
-        self.history = []
+        if cache is None:
+            cache = level_cache.LevelCache()
+        self.cache = cache
+        self.prefetcher = LevelPrefetcher(self.player, self.cache,
+                                          THREADED_PREFETCH)
         self.scrolling = False
         self.screen_copy = None
         self.next_screen = pg.Surface(prepare.PLAY_RECT.size).convert()
         self.scroll_vector = None
+        self.dirty_level = None #Level last drawn by draw_dirty.
         start_coords = self.player.save_world_coords
         self.level = self.update_history(self.world_dict[start_coords])
         self.current_coords = list(start_coords)
         self.offset = [0, 0]
         self.drawn_this_frame = False #Disallow multiple updates per frame.
+        self.prefetch_neighbors()
 
     def load(self, world_name):
         """Load world given a world_name."""
         path = os.path.join(".", "resources", "world_data", world_name)
-        with open(path) as myfile:
-            return yaml.load(myfile)
+        return yaml_loader.load_file(path)
 
     def update_history(self, next_map_name):
         """
-        Check to see if the current map is saved in history.  If it is
-        found, use the old map (don't respawn monsters etc.).  If not, create a
-        new map and place it in history.  Remove older maps if MAX_HISTORY is
-        exceeded."""
-        try:
-            index = [mapp.name for mapp in self.history].index(next_map_name)
-            next_map = self.history.pop(index)
-        except ValueError:
-            next_map = level.Level(self.player, next_map_name)
-        if len(self.history) == MAX_HISTORY:
-            del self.history[-1]
-        self.history.insert(0, next_map)
-        return self.history[0]
+        Check to see if the map is in the level cache.  If it is found, use
+        the old map (don't respawn monsters etc.).  If not, take the level
+        from the prefetcher or create it, and add it to the cache (which may
+        evict the least recently used levels).
+        """
+        key = (self.name, next_map_name)
+        next_map = self.cache.get(key)
+        if not next_map:
+            next_map = self.prefetcher.take(next_map_name)
+            if not next_map:
+                next_map = level.Level(self.player, next_map_name)
+            self.cache.put(key, next_map)
+        return next_map
+
+    def prefetch_neighbors(self):
+        """
+        Request prefetching of the (up to four) maps adjacent to the current
+        map that are not already cached.
+        """
+        neighbors = []
+        for vector in prepare.DIRECT_DICT.values():
+            coords = (self.current_coords[0]+vector[0],
+                      self.current_coords[1]+vector[1])
+            map_name = self.world_dict.get(coords)
+            if map_name and (self.name, map_name) not in self.cache:
+                neighbors.append(map_name)
+        self.prefetcher.prefetch(neighbors)
+
+    def close(self):
+        """
+        Stop background work associated with this world.  Cached levels are
+        left in the cache.
+        """
+        self.prefetcher.close()
 
     def check_change_map(self):
         """
@@ -86,7 +245,9 @@ class WorldMap(object):
             next_map = self.world_dict[tuple(self.current_coords)]
             self.level.on_map_change()
             self.level = self.update_history(next_map)
+            self.prefetch_neighbors()
             self.scrolling = True
+            self.player.checkpoint = True
 
     def update(self, now):
         """
@@ -98,6 +259,7 @@ class WorldMap(object):
         else:
             self.level.update(now)
             self.check_change_map()
+        self.prefetcher.update()
 
     def prepare_scroll(self):
         """
@@ -121,7 +283,7 @@ class WorldMap(object):
         """
         if not self.screen_copy:
             self.prepare_scroll()
-        elif self.drawn_this_frame:
+        elif self.drawn_this_frame or not SCROLL_PER_FRAME:
             for i in (0,1):
                 self.offset[i] -= SCROLL_SPEED*self.scroll_vector[i]
                 if abs(self.offset[i]) >= prepare.PLAY_RECT.size[i]:
@@ -176,3 +338,19 @@ class WorldMap(object):
         elif not self.scrolling:
             self.level.draw(surface, interpolate)
         self.drawn_this_frame = True
+
+    def draw_dirty(self, surface, interpolate, full=False):
+        """
+        Draw only the changed areas of the current level and return a list of
+        rects to update.  While scrolling the whole screen changes, so the
+        scroll is drawn normally and None is returned.  The level is drawn in
+        full the first time it is shown (or if full is True).
+        """
+        if self.scrolling:
+            self.draw(surface, interpolate)
+            self.dirty_level = None
+            return None
+        full = full or self.level is not self.dirty_level
+        self.dirty_level = self.level
+        self.drawn_this_frame = True
+        return self.level.draw_dirty(surface, interpolate, full)
@@ -0,0 +1,210 @@
+"""
+This module runs the game loop without a display.  SDL's dummy video and
+audio drivers are used and the display is never updated.  Time comes from a
+synthetic clock that advances one fixed timestep per update, so updates run
+as fast as the simulation allows.  Input is read from a script instead of the
+event queue.  Used for soak testing maps, measuring simulation throughput and
+running the game where there is no display.  The CABBAGES_HEADLESS
+environment variable must be set before prepare is imported (headless.py in
+the project root does this).
+
+Script files contain one event per line in the form "tick action [key]".
+The action is down, up or quit; keys are pygame key names without the K_
+prefix.  Blank lines and lines starting with # are ignored.  For example:
+
+    0 down RIGHT
+    150 up RIGHT
+    150 down SPACE
+"""
+
+import copy
+import time
+import random
+import argparse
+import pygame as pg
+
+from . import prepare, tools
+from .profiler import PROFILER
+from .main import make_states
+from .components import player, world
+
+
+DEFAULT_TICKS = 3600 #One minute of game time.
+SCRIPT_ACTIONS = {"down" : pg.KEYDOWN, "up" : pg.KEYUP, "quit" : pg.QUIT}
+
+
+class ScriptError(Exception):
+    """Exception thrown for a malformed input script."""
+    pass
+
+
+class KeyState(object):
+    """
+    Stands in for the result of pg.key.get_pressed; indexing with a key
+    constant returns whether that key is held.
+    """
+    def __init__(self):
+        self.pressed = set()
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+    def update(self, event):
+        """Update the held keys from a KEYDOWN or KEYUP event."""
+        if event.type == pg.KEYDOWN:
+            self.pressed.add(event.key)
+        elif event.type == pg.KEYUP:
+            self.pressed.discard(event.key)
+
+
+def parse_script(lines):
+    """
+    Parse lines of a script.  Returns a dict mapping ticks to lists of the
+    events to post on that tick.
+    """
+    script = {}
+    for number,line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        parts = line.split()
+        try:
+            tick, event_type = int(parts[0]), SCRIPT_ACTIONS[parts[1]]
+            if event_type == pg.QUIT:
+                event = pg.event.Event(event_type)
+            else:
+                key = getattr(pg, "K_{}".format(parts[2]))
+                event = pg.event.Event(event_type, key=key)
+        except (ValueError, IndexError, KeyError, AttributeError):
+            raise ScriptError("Bad script line {}: {}".format(number, line))
+        script.setdefault(tick, []).append(event)
+    return script
+
+
+def load_script(path):
+    """Load a script file."""
+    with open(path) as myfile:
+        return parse_script(myfile)
+
+
+class HeadlessControl(tools.Control):
+    """
+    A Control whose loop steps one update per iteration under a synthetic
+    clock.  Events come from the script; nothing is drawn unless render is
+    True, and the display is never updated either way.
+    """
+    def __init__(self, caption, script=None, render=False):
+        tools.Control.__init__(self, caption)
+        self.clock = tools.SyntheticClock()
+        tools.set_clock(self.clock)
+        self.script = script if script else {}
+        self.keys = KeyState()
+        self.render = render
+        self.fps_visible = False
+        self.ticks = 0
+
+    def update(self):
+        """Advance the synthetic clock one timestep and update the state."""
+        self.now = self.clock.advance()
+        self.state_machine.update(self.keys, self.now)
+
+    def draw(self, interpolate):
+        """Draw the state if rendering is enabled; never update the display."""
+        if self.render and not self.state_machine.state.done:
+            self.state_machine.draw(self.screen, interpolate)
+
+    def event_loop(self):
+        """Pass this tick's scripted events to the state_machine."""
+        for event in self.script.get(self.ticks, ()):
+            if event.type == pg.QUIT:
+                self.done = True
+            else:
+                self.keys.update(event)
+            self.state_machine.get_event(event)
+
+    def main(self, ticks=None):
+        """
+        Run until done, the state machine quits, or the given number of
+        ticks have passed.  Returns the number of ticks run per second.
+        """
+        start = time.time()
+        while not (self.done or self.state_machine.done):
+            if ticks is not None and self.ticks >= ticks:
+                break
+            PROFILER.start_frame()
+            with PROFILER.section("event_loop"):
+                self.event_loop()
+            with PROFILER.section("update"):
+                self.update()
+            with PROFILER.section("draw"):
+                self.draw(0)
+            PROFILER.end_frame()
+            self.ticks += 1
+        elapsed = time.time()-start
+        if PROFILER.enabled:
+            PROFILER.stop()
+        return self.ticks/elapsed if elapsed else float("inf")
+
+
+def make_player(world=None, coords=None, name="HEADLESS"):
+    """
+    Create a new player, optionally starting in the given world file and
+    map coordinates.
+    """
+    data = copy.deepcopy(prepare.DEFAULT_PLAYER)
+    data["name"] = name
+    if world:
+        data["world"] = world
+    if coords:
+        data["save_world_coords"] = tuple(coords)
+    return player.Player(data)
+
+
+def start_game(app, new_player, save_slot=None):
+    """
+    Set up the app's states and start directly in the Game state.  The
+    player is only saved if a save_slot is given, so by default headless
+    runs never write over real save slots.
+    """
+    world.SCROLL_PER_FRAME = False #Nothing may be drawn.
+    app.state_machine.loader = prepare.preload_graphics
+    app.state_machine.setup_states(make_states(), "GAME")
+    persist = {"player" : new_player, "save_slot" : save_slot}
+    app.state_machine.state.startup(tools.get_ticks(), persist)
+
+
+def parse_coords(text):
+    """Parse map coordinates given as x,y."""
+    try:
+        x, y = (int(value) for value in text.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError("Coordinates must be given as x,y.")
+    return x, y
+
+
+def main():
+    """Command line interface for headless runs."""
+    parser = argparse.ArgumentParser(description="Run the game headless.")
+    parser.add_argument("-t", "--ticks", type=int, default=DEFAULT_TICKS,
+                        help="number of updates to run")
+    parser.add_argument("-s", "--script", help="input script file")
+    parser.add_argument("-w", "--world", help="world file to start in")
+    parser.add_argument("-c", "--coords", type=parse_coords,
+                        help="map coordinates to start at (x,y)")
+    parser.add_argument("-r", "--render", action="store_true",
+                        help="draw every tick (the display is not updated)")
+    parser.add_argument("--seed", type=int, help="seed for random")
+    parser.add_argument("-p", "--profile", metavar="PATH",
+                        help="profile every tick and log to PATH (.csv/.json)")
+    args = parser.parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+    if args.profile:
+        PROFILER.path = args.profile
+        PROFILER.start()
+    script = load_script(args.script) if args.script else None
+    app = HeadlessControl(prepare.ORIGINAL_CAPTION, script, args.render)
+    start_game(app, make_player(args.world, args.coords))
+    rate = app.main(args.ticks)
+    prepare.AUTOSAVE.flush()
+    print("{} ticks at {:.1f} ticks/sec.".format(app.ticks, rate))
@@ -10,16 +10,22 @@ from . import prepare, tools
 from .states import title, splash, select, register, viewcontrols, game, camp
 
 
-def main():
+def make_states():
     """Add states to control here."""
+    return {"SPLASH"   : splash.Splash(),
+            "TITLE"    : title.Title(),
+            "SELECT"   : select.Select(),
+            "REGISTER" : register.Register(),
+            "CONTROLS" : viewcontrols.ViewControls(),
+            "GAME"     : game.Game(),
+            "CAMP"     : camp.Camp()
+            }
+
+
+def main():
+    """Create the Control and start the game from the splash screen."""
     app = tools.Control(prepare.ORIGINAL_CAPTION)
-    state_dict = {"SPLASH"   : splash.Splash(),
-                  "TITLE"    : title.Title(),
-                  "SELECT"   : select.Select(),
-                  "REGISTER" : register.Register(),
-                  "CONTROLS" : viewcontrols.ViewControls(),
-                  "GAME"     : game.Game(),
-                  "CAMP"     : camp.Camp()
-                  }
-    app.state_machine.setup_states(state_dict, "SPLASH")
+    app.state_machine.loader = prepare.preload_graphics
+    app.state_machine.setup_states(make_states(), "SPLASH")
     app.main()
+    prepare.AUTOSAVE.flush()
@@ -0,0 +1,313 @@
+"""
+This module maintains precompiled binary versions of the map files.
+Parsing the YAML map files is slow enough to cause a noticeable hitch on map
+transitions, so each map is compiled into a compact cache file the first time
+it is loaded (or ahead of time via build_map_cache.py).  A cache file records
+the modification time and SHA-1 hash of its source; if the source changes the
+cache is considered stale and the map is reloaded from YAML.  If only the
+modification time differs (after a checkout or touch) the cache is kept and
+its header updated.  Cache files are replaced atomically, and a damaged cache
+is treated as stale, so an interrupted write never breaks a map.
+
+Cache layout (all values little-endian):
+    header: magic, format version, python version, source mtime, source hash
+    string table: every sheet name and other string used by cell records
+    layers: a name, a record kind, and the records themselves
+
+Standard tile layers are stored as fixed-width cell records.  The handful of
+object layers (enemies, chests, portals, etc.) hold heterogeneous data and are
+stored as marshalled blobs.
+"""
+
+import os
+import sys
+import struct
+import marshal
+import hashlib
+import argparse
+import tempfile
+
+
+from . import yaml_loader
+
+
+MAP_DIRECTORY = os.path.join(".", "resources", "map_data")
+CACHE_DIRECTORY = os.path.join(MAP_DIRECTORY, "cache")
+CACHE_EXTENSION = ".mapc"
+
+MAGIC = b"CKMC"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHBBd20sH")
+STRING_LENGTH = struct.Struct("<H")
+LAYER_HEADER = struct.Struct("<HBI")
+TILE_RECORD = struct.Struct("<hhHhh") #Target x,y; sheet index; source x,y.
+COLOR_RECORD = struct.Struct("<hhHBBBB") #Target x,y; name index; RGBA.
+FILL_RECORD = struct.Struct("<BBBB")
+
+KIND_TILES = 0
+KIND_COLORS = 1
+KIND_BLOB = 2
+
+try:
+    STRING_TYPES = (str, unicode)
+except NameError:
+    STRING_TYPES = (str,)
+
+_replace = getattr(os, "replace", os.rename) #os.replace is Python 3 only.
+
+
+class StaleCacheError(Exception):
+    """Exception thrown if a cache file does not match its source map."""
+    pass
+
+
+#Errors that mean a cache file is missing, stale or damaged.  Truncated or
+#corrupt data can fail in the struct, marshal or table lookups.
+CACHE_ERRORS = (IOError, OSError, StaleCacheError, struct.error, ValueError,
+                EOFError, IndexError, KeyError, TypeError)
+
+
+def get_cache_path(path):
+    """Return the cache file path corresponding to the map file at path."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(CACHE_DIRECTORY, name+CACHE_EXTENSION)
+
+
+def hash_file(path):
+    """Return the SHA-1 digest of the file at path."""
+    with open(path, "rb") as myfile:
+        return hashlib.sha1(myfile.read()).digest()
+
+
+def load(path):
+    """
+    Return the map dictionary for the map file at path.  The compiled cache
+    is used if it is current; otherwise the map is loaded from YAML and the
+    cache is rewritten.
+    """
+    cache_path = get_cache_path(path)
+    try:
+        return read_cache(cache_path, path)
+    except CACHE_ERRORS:
+        pass
+    map_dict = yaml_loader.load_file(path)
+    try:
+        write_cache(map_dict, path, cache_path)
+    except (IOError, OSError):
+        pass #A read-only install simply falls back to YAML every time.
+    return map_dict
+
+
+def read_cache(cache_path, source_path):
+    """
+    Read a compiled map.  Raises StaleCacheError if the cache was built from
+    a different version of the source file; damaged data raises one of
+    CACHE_ERRORS.  If only the modification time differs, the source is
+    rehashed before the cache is rejected; if the hash matches, the cache
+    header is rewritten with the new time.
+    """
+    with open(cache_path, "rb") as myfile:
+        data = myfile.read()
+    header = HEADER.unpack_from(data)
+    magic, version, major, minor, mtime, digest, count = header
+    if (magic, version) != (MAGIC, FORMAT_VERSION):
+        raise StaleCacheError("Unrecognized cache format.")
+    if (major, minor) != sys.version_info[:2]:
+        raise StaleCacheError("Cache built by a different python version.")
+    source_mtime = os.path.getmtime(source_path)
+    if mtime != source_mtime and digest != hash_file(source_path):
+        raise StaleCacheError("Source map has changed.")
+    strings, offset = read_strings(data, HEADER.size)
+    map_dict = {}
+    for _ in range(count):
+        name, kind, length = LAYER_HEADER.unpack_from(data, offset)
+        offset += LAYER_HEADER.size
+        reader = LAYER_READERS[kind]
+        map_dict[strings[name]], offset = reader(data, offset, length, strings)
+    if mtime != source_mtime:
+        header = HEADER.pack(magic, version, major, minor, source_mtime,
+                             digest, count)
+        try:
+            write_file(cache_path, header+data[HEADER.size:])
+        except (IOError, OSError):
+            pass
+    return map_dict
+
+
+def read_strings(data, offset):
+    """Read the string table; return the list of strings and new offset."""
+    count, = STRING_LENGTH.unpack_from(data, offset)
+    offset += STRING_LENGTH.size
+    strings = []
+    for _ in range(count):
+        length, = STRING_LENGTH.unpack_from(data, offset)
+        offset += STRING_LENGTH.size
+        strings.append(data[offset:offset+length].decode("utf-8"))
+        offset += length
+    return strings, offset
+
+
+def read_tiles(data, offset, count, strings):
+    """Read a layer of fixed-width (sheet, source) tile records."""
+    layer = {}
+    for _ in range(count):
+        x, y, sheet, src_x, src_y = TILE_RECORD.unpack_from(data, offset)
+        layer[(x,y)] = (strings[sheet], (src_x,src_y))
+        offset += TILE_RECORD.size
+    return layer, offset
+
+
+def read_colors(data, offset, count, strings):
+    """Read the fill color and fixed-width background color records."""
+    layer = {"fill" : FILL_RECORD.unpack_from(data, offset)}
+    offset += FILL_RECORD.size
+    for _ in range(count):
+        record = COLOR_RECORD.unpack_from(data, offset)
+        layer[record[:2]] = (strings[record[2]], record[3:])
+        offset += COLOR_RECORD.size
+    return layer, offset
+
+
+def read_blob(data, offset, count, strings):
+    """Read a marshalled layer."""
+    end = offset+count
+    return marshal.loads(data[offset:end]), end
+
+
+LAYER_READERS = {KIND_TILES : read_tiles,
+                 KIND_COLORS : read_colors,
+                 KIND_BLOB : read_blob}
+
+
+def write_cache(map_dict, source_path, cache_path):
+    """Compile map_dict and write it to cache_path."""
+    write_file(cache_path, compile_map(map_dict, source_path))
+
+
+def write_file(cache_path, data):
+    """
+    Write data to cache_path through a temporary file that is renamed over
+    it, so the cache is never seen partly written (by a concurrent load or
+    after the game is killed mid write).
+    """
+    directory = os.path.dirname(cache_path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    handle, temp_path = tempfile.mkstemp(".tmp", "map", directory)
+    try:
+        with os.fdopen(handle, "wb") as myfile:
+            myfile.write(data)
+        _replace(temp_path, cache_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def compile_map(map_dict, source_path):
+    """Return the binary cache representation of map_dict as bytes."""
+    strings = {}
+    layers = []
+    for name in sorted(map_dict):
+        layer = map_dict[name]
+        index = intern_string(strings, name)
+        if is_color_layer(layer):
+            kind, count, payload = KIND_COLORS, len(layer)-1, []
+            payload.append(FILL_RECORD.pack(*layer["fill"]))
+            for target in sorted(k for k in layer if k != "fill"):
+                color_name, color = layer[target]
+                sheet = intern_string(strings, color_name)
+                payload.append(COLOR_RECORD.pack(target[0], target[1],
+                                                 sheet, *color))
+        elif is_tile_layer(layer):
+            kind, count, payload = KIND_TILES, len(layer), []
+            for target in sorted(layer):
+                sheet, source = layer[target]
+                sheet = intern_string(strings, sheet)
+                payload.append(TILE_RECORD.pack(target[0], target[1],
+                                                sheet, *source))
+        else:
+            blob = marshal.dumps(layer)
+            kind, count, payload = KIND_BLOB, len(blob), [blob]
+        layers.append(LAYER_HEADER.pack(index, kind, count)+b"".join(payload))
+    mtime = os.path.getmtime(source_path)
+    major, minor = sys.version_info[:2]
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, major, minor, mtime,
+                         hash_file(source_path), len(layers))
+    return header+pack_strings(strings)+b"".join(layers)
+
+
+def intern_string(strings, string):
+    """Add string to the string table if needed and return its index."""
+    return strings.setdefault(string, len(strings))
+
+
+def pack_strings(strings):
+    """Return the binary representation of the string table."""
+    ordered = sorted(strings, key=strings.get)
+    packed = [STRING_LENGTH.pack(len(ordered))]
+    for string in ordered:
+        encoded = string.encode("utf-8")
+        packed.append(STRING_LENGTH.pack(len(encoded))+encoded)
+    return b"".join(packed)
+
+
+def is_cell(value, length):
+    """Check that value is a tuple of length ints that fit a record field."""
+    return (isinstance(value, tuple) and len(value) == length and
+            all(isinstance(v, int) and -32768 <= v < 32768 for v in value))
+
+
+def is_tile_layer(layer):
+    """Check if every entry of layer fits a fixed-width tile record."""
+    for target, value in layer.items():
+        if not (is_cell(target, 2) and isinstance(value, tuple) and
+                len(value) == 2 and isinstance(value[0], STRING_TYPES) and
+                is_cell(value[1], 2)):
+            return False
+    return True
+
+
+def is_color_layer(layer):
+    """Check if layer is a background color layer (has a fill color)."""
+    if not is_cell(layer.get("fill"), 4):
+        return False
+    for target, value in layer.items():
+        if target != "fill" and not (is_cell(target, 2) and
+                isinstance(value, tuple) and len(value) == 2 and
+                isinstance(value[0], STRING_TYPES) and is_cell(value[1], 4)):
+            return False
+    return True
+
+
+def build_all(directory=MAP_DIRECTORY, force=False):
+    """
+    Compile every map in directory.  Maps with a current cache are skipped
+    unless force is True.  Returns a list of the map names compiled.
+    """
+    built = []
+    for map_name in sorted(os.listdir(directory)):
+        if os.path.splitext(map_name)[1].lower() != ".map":
+            continue
+        path = os.path.join(directory, map_name)
+        cache_path = get_cache_path(path)
+        if not force:
+            try:
+                read_cache(cache_path, path)
+                continue
+            except CACHE_ERRORS:
+                pass
+        write_cache(yaml_loader.load_file(path), path, cache_path)
+        built.append(map_name)
+    return built
+
+
+def main():
+    """Command line interface for prebuilding all map caches."""
+    parser = argparse.ArgumentParser(description="Compile map cache files.")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="rebuild caches even if they are current")
+    args = parser.parse_args()
+    built = build_all(force=args.force)
+    for map_name in built:
+        print("Compiled {}".format(map_name))
+    print("{} map(s) compiled.".format(len(built)))
@@ -3,19 +3,12 @@ The state for editing the individual maps.
 """
 
 import os
-import sys
 import wx
 import pygame as pg
 
-from .. import map_prepare, state_machine
+from .. import map_prepare, state_machine, yaml_loader
 from ..map_components import toolbar, panel, modes
 
-if sys.version_info[0] < 3:
-    import yaml
-else:
-    import yaml3 as yaml
-
-
 BACKGROUND_COLOR = (30, 40, 50)
 
 LAYERS = ("BG Colors", "BG Tiles", "Water", "Solid",
@@ -95,7 +88,7 @@ class Edit(state_machine._State):
         if path:
             try:
                 with open(path,"w") as myfile:
-                    yaml.dump(self.map_state.map_dict, myfile)
+                    yaml_loader.dump(self.map_state.map_dict, myfile)
                     print("Map saved.")
             except IOError:
                 print("Invalid filename.")
@@ -115,7 +108,7 @@ class Edit(state_machine._State):
         if path:
             try:
                 with open(path) as myfile:
-                    self.map_state.map_dict.update(yaml.load(myfile))
+                    self.map_state.map_dict.update(yaml_loader.load(myfile))
                     print("Map loaded.\n")
             except IOError:
                 print("File not found.")
@@ -0,0 +1,149 @@
+"""
+Measures the memory used by levels with tracemalloc.  For each map the
+level is built headlessly and the memory it holds once built (its
+footprint) is recorded.  The level is then updated for a number of ticks,
+recording the average memory allocated and freed again within each tick
+(its garbage, the rise of the tracemalloc peak above the start of the tick)
+and the net growth per tick.  Finally the average size of an instance and
+its attribute dictionary is reported for each sprite class in the level.
+
+Requires Python 3.9+ (tracemalloc.reset_peak).  The CABBAGES_HEADLESS
+environment variable must be set before prepare is imported;
+benchmark_memory.py in the project root does this.
+"""
+
+import os
+import gc
+import sys
+import random
+import argparse
+import collections
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from . import tools, map_cache
+from .headless import make_player
+from .components import level
+
+
+DEFAULT_TICKS = 600
+DEFAULT_SEED = 1
+
+
+def get_maps(directory=map_cache.MAP_DIRECTORY):
+    """Return the names of all maps in directory, sorted."""
+    return sorted(name for name in os.listdir(directory)
+                  if name.endswith(".map"))
+
+
+def traced_memory():
+    """Return the bytes currently traced after a full collection."""
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def measure_footprint(player, map_name):
+    """
+    Return a newly built level for map_name and the bytes it holds.  The
+    map is built once beforehand so that graphics and map data loaded on
+    first use are not counted.
+    """
+    level.Level(player, map_name).discard()
+    start = traced_memory()
+    new_level = level.Level(player, map_name)
+    return new_level, traced_memory()-start
+
+
+def measure_ticks(current_level, clock, ticks):
+    """
+    Update current_level for ticks updates, advancing clock before each.
+    Returns the average bytes of garbage per tick and the average net
+    growth per tick.
+    """
+    garbage = 0
+    start = traced_memory()
+    for _ in range(ticks):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        current_level.update(clock.advance())
+        garbage += tracemalloc.get_traced_memory()[1]-before
+    growth = traced_memory()-start
+    return garbage/float(ticks), growth/float(ticks)
+
+
+def instance_size(sprite):
+    """Return the bytes of sprite and its attribute dictionary (if any)."""
+    size = sys.getsizeof(sprite)
+    if hasattr(sprite, "__dict__"):
+        size += sys.getsizeof(sprite.__dict__)
+    return size
+
+
+def measure_classes(current_level):
+    """
+    Return a list of (class name, count, average instance bytes) for the
+    sprites of current_level, largest count first.  Reading __dict__ can
+    change how an instance is stored, so this is measured last.
+    """
+    sizes = collections.defaultdict(list)
+    sprites = set(current_level.all_group)
+    sprites.update(current_level.solids, current_level.shadows)
+    for sprite in sprites:
+        sizes[type(sprite).__name__].append(instance_size(sprite))
+    results = [(name, len(found), sum(found)/float(len(found)))
+               for name,found in sizes.items()]
+    return sorted(results, key=lambda result: (-result[1], result[0]))
+
+
+def benchmark(maps, ticks=DEFAULT_TICKS, seed=DEFAULT_SEED):
+    """
+    Measure each map in maps.  Returns a list of (map name, footprint bytes,
+    garbage bytes per tick, growth bytes per tick, class sizes).
+    """
+    results = []
+    clock = tools.SyntheticClock()
+    tools.set_clock(clock)
+    tracemalloc.start()
+    try:
+        for map_name in maps:
+            random.seed(seed)
+            player = make_player()
+            current_level, footprint = measure_footprint(player, map_name)
+            garbage, growth = measure_ticks(current_level, clock, ticks)
+            classes = measure_classes(current_level)
+            current_level.discard()
+            results.append((map_name, footprint, garbage, growth, classes))
+    finally:
+        tracemalloc.stop()
+        tools.set_clock(None)
+    return results
+
+
+def main():
+    """Command line interface for the memory benchmark."""
+    parser = argparse.ArgumentParser(description="Measure level memory.")
+    parser.add_argument("maps", nargs="*",
+                        help="map files to measure (default all)")
+    parser.add_argument("-t", "--ticks", type=int, default=DEFAULT_TICKS,
+                        help="updates to run on each level")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="also show the instance size of each class")
+    args = parser.parse_args()
+    if not hasattr(tracemalloc, "reset_peak"):
+        print("The memory benchmark requires Python 3.9 or later.")
+        return
+    results = benchmark(args.maps or get_maps(), args.ticks)
+    for map_name, footprint, garbage, growth, classes in results:
+        line = "{:<28} footprint {:8.1f} KiB   garbage {:7.1f} B/tick"
+        line += "   growth {:6.1f} B/tick"
+        print(line.format(map_name, footprint/1024.0, garbage, growth))
+        if args.verbose:
+            for name, count, size in classes:
+                print("    {:<24} {:5} x {:6.1f} B".format(name, count, size))
+    count = float(len(results))
+    print("{} maps: footprint {:.1f} KiB, garbage {:.1f} B/tick".format(
+        len(results), sum(result[1] for result in results)/count/1024.0,
+        sum(result[2] for result in results)/count))
@@ -6,7 +6,14 @@ Also contained are various constants used throughout the program.
 import os
 import pygame as pg
 
-from . import tools
+from . import tools, atlas, save_store
+
+
+#Headless mode (see headless.py) uses SDL's dummy drivers; no window is shown.
+HEADLESS = bool(os.environ.get("CABBAGES_HEADLESS"))
+if HEADLESS:
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
 
 
 pg.init()
@@ -30,10 +37,26 @@ _screen = pg.display.set_mode(SCREEN_SIZE)
 
 
 #Display until loading finishes.
+LOADING_BAR_RECT = pg.Rect(0, 0, 600, 30)
+LOADING_BAR_RECT.midtop = (SCREEN_RECT.centerx, SCREEN_RECT.centery+80)
 _screen.fill(BACKGROUND_COLOR)
 _render = BIG_FONT.render("LOADING...", 0, pg.Color("white"))
 _screen.blit(_render, _render.get_rect(center=SCREEN_RECT.center))
-pg.display.update()
+_screen.fill(pg.Color("white"), LOADING_BAR_RECT)
+_screen.fill(BACKGROUND_COLOR, LOADING_BAR_RECT.inflate(-6, -6))
+if not HEADLESS:
+    pg.display.update()
+
+
+def draw_loading_bar(fraction):
+    """Fill the given fraction of the loading bar and update its area."""
+    if HEADLESS:
+        return
+    pg.event.pump() #Keep the window responsive while loading.
+    inner = LOADING_BAR_RECT.inflate(-10, -10)
+    inner.width = int(inner.width*fraction)
+    _screen.fill(pg.Color("white"), inner)
+    pg.display.update(LOADING_BAR_RECT)
 
 
 #General constants
@@ -41,6 +64,7 @@ PLAY_RECT = pg.Rect(0, 0, 1000, 700)
 CELL_SIZE = (50, 50)
 MAX_HEALTH = 28
 MAX_MONEY = 9999
+DIRTY_RECTS = False #Only update changed areas of the display during play.
 
 DIRECTIONS = ["front", "back", "left", "right"]
 
@@ -85,24 +109,147 @@ Z_ORDER = {"BG Tiles" : -4,
            "Foreground" : 800,
            "Projectiles" : 850}
 
+#Save slots; "binary" stores compressed records instead of plain JSON.
+SAVE_ENCODING = "json"
+SAVES = save_store.SaveStore(save_store.SAVE_DIRECTORY, SAVE_ENCODING)
+LEGACY_SAVE_PATH = os.path.join(save_store.SAVE_DIRECTORY, "save_data.dat")
+SAVES.import_legacy(LEGACY_SAVE_PATH)
+#Write saves made during play on a worker thread (see save_store.AutoSaver).
+THREADED_AUTOSAVE = True
+AUTOSAVE = save_store.AutoSaver(SAVES, THREADED_AUTOSAVE)
+
 #Resource loading (Fonts and music just contain path names).
-SAVE_PATH = os.path.join("resources", "save_data", "save_data.dat")
 FONTS = tools.load_all_fonts(os.path.join("resources", "fonts"))
 MUSIC = tools.load_all_music(os.path.join("resources", "music"))
-SFX   = tools.load_all_sfx(os.path.join("resources", "sound"))
+GFX_TYPES = (".png", ".jpg", ".bmp")
+SFX_TYPES = (".wav", ".mp3", ".ogg", ".mdi")
 
+#Graphics are loaded on first access (see tools.LazyGraphics).
+_GFX_PATH = os.path.join("resources", "graphics")
+_SUB_DIRECTORIES = ["enemies", "equips", "mapsheets", "misc", "objects"]
+_SOUND_DIRECTORY = os.path.join("resources", "sound")
+GFX = {directory : tools.LazyGraphics(os.path.join(_GFX_PATH, directory),
+                                      COLOR_KEY, GFX_TYPES)
+       for directory in _SUB_DIRECTORIES}
+SFX = {}
+ATLAS = atlas.load_atlas() #None until build_atlas.py has been run.
+_FRAME_CACHE = {} #(directory, sheet, location, flip) to frame; see get_frame.
+_MASK_CACHE = {} #Cell sources and solid shapes to masks; see get_mask.
+
+#Graphics used at import, by the first states and by most maps.
+_STARTUP_GRAPHICS = [("enemies", "enemysheet"),
+                     ("enemies", "enemysheet1"),
+                     ("equips", "geardisplay"),
+                     ("objects", "projectiles"),
+                     ("objects", "items"),
+                     ("misc", "retry"),
+                     ("misc", "menu_arrows"),
+                     ("misc", "gear_box"),
+                     ("misc", "stat_arrows"),
+                     ("misc", "splash1"),
+                     ("misc", "title_ground"),
+                     ("misc", "titlewords")]
+
+
+def load_resources(graphics, sound_directory=None, progress=False):
+    """
+    Load the graphics listed in graphics, (directory, name) pairs, that have
+    not been loaded yet and, if given, the sound effects in sound_directory.
+    Files are decoded on a pool of threads (see tools.load_parallel); images
+    are converted here, on the main thread, as they arrive.  If progress is
+    True the loading bar advances as each file finishes.
+    """
+    jobs = []
+    for directory,name in graphics:
+        if not GFX[directory].is_loaded(name):
+            path = GFX[directory].paths[name]
+            jobs.append(((directory, name), pg.image.load, path))
+    if sound_directory:
+        for name,path in tools.find_files(sound_directory, SFX_TYPES):
+            jobs.append(((None, name), pg.mixer.Sound, path))
+    loaded = tools.load_parallel(jobs)
+    for count,((directory, name), resource) in enumerate(loaded, 1):
+        if directory is None:
+            SFX[name] = resource
+        else:
+            GFX[directory].store(name, resource)
+        if progress:
+            draw_loading_bar(count/float(len(jobs)))
+
+
+def get_cell(directory, sheet, location):
+    """
+    Return the CELL_SIZE frame at location (in pixels) on a sheet.  The frame
+    comes from the texture atlas if it has one; otherwise it is a subsurface
+    of the sheet.
+    """
+    name = atlas.frame_name(directory, sheet, location)
+    if ATLAS and name in ATLAS:
+        return ATLAS.get_frame(name)
+    return GFX[directory][sheet].subsurface(pg.Rect(location, CELL_SIZE))
 
-def graphics_from_directories(directories):
+
+def get_frame(directory, sheet, location, flip=False):
     """
-    Calls the tools.load_all_graphics() function for all directories passed.
+    Return the CELL_SIZE frame at location (in pixels) on a sheet, flipped
+    horizontally if flip is True.  Frames are cached for the life of the
+    program and shared by every sprite that asks for them, so they must
+    never be drawn on.
     """
-    base_path = os.path.join("resources", "graphics")
-    GFX = {}
-    for directory in directories:
-        path = os.path.join(base_path, directory)
-        GFX[directory] = tools.load_all_gfx(path)
-    return GFX
+    key = (directory, sheet, tuple(location), flip)
+    if key not in _FRAME_CACHE:
+        frame = get_cell(directory, sheet, location)
+        if flip:
+            frame = pg.transform.flip(frame, True, False)
+        _FRAME_CACHE[key] = frame
+    return _FRAME_CACHE[key]
 
 
-_SUB_DIRECTORIES = ["enemies", "equips", "mapsheets", "misc", "objects"]
-GFX = graphics_from_directories(_SUB_DIRECTORIES)
+def get_frames(directory, sheet, coords, flip=False):
+    """
+    Return the cached frames (see get_frame) at a list of cell coordinates
+    on a sheet.
+    """
+    width, height = CELL_SIZE
+    return [get_frame(directory, sheet, (x*width, y*height), flip)
+            for x,y in coords]
+
+
+def get_mask(directory, sheet, location):
+    """
+    Return the collision mask of the cell at location on a sheet (see
+    get_cell).  Masks are cached by source and shared by every sprite using
+    them, so they must never be modified.
+    """
+    key = (directory, sheet, tuple(location))
+    if key not in _MASK_CACHE:
+        cell = get_cell(directory, sheet, location)
+        _MASK_CACHE[key] = pg.mask.from_surface(cell)
+    return _MASK_CACHE[key]
+
+
+def get_solid_mask(size=CELL_SIZE, rect=None):
+    """
+    Return a shared mask of the given size with every bit inside rect set
+    (the whole mask if rect is None).  See get_mask.
+    """
+    key = (tuple(size), tuple(rect) if rect else None)
+    if key not in _MASK_CACHE:
+        rect = pg.Rect(rect) if rect else pg.Rect((0,0), size)
+        solid = pg.Mask(rect.size)
+        solid.fill()
+        mask = pg.Mask(size)
+        mask.draw(solid, rect.topleft)
+        _MASK_CACHE[key] = mask
+    return _MASK_CACHE[key]
+
+
+def preload_graphics(manifest):
+    """
+    Load the graphics in a state's preload manifest before it starts up.
+    Set as the loader of the game's StateMachine.
+    """
+    load_resources(manifest)
+
+
+load_resources(_STARTUP_GRAPHICS, _SOUND_DIRECTORY, True)
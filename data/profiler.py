@@ -0,0 +1,243 @@
+"""
+A per-frame profiler.  When enabled (F6 toggles it in game) each frame
+records the time spent in named sections of the main loop and game code,
+the number of sprites in each of the level's groups, and the net number of
+memory blocks allocated.  An overlay shows averages over recent frames, and
+when profiling stops the frames are written to a CSV or JSON log.
+
+Sections are timed with PROFILER.section (a context manager) or the timed
+decorator.  Timings are inclusive; a section containing another (Level.update
+contains check_collisions) includes its time.  Both cost very little while
+the profiler is disabled.
+"""
+
+import sys
+import csv
+import json
+import timeit
+import functools
+import collections
+
+import pygame as pg
+
+
+LOG_PATH = "profile.csv" #A .json extension writes JSON instead.
+OVERLAY_FRAMES = 60 #Number of recent frames averaged by the overlay.
+OVERLAY_POSITION = (10, 10)
+OVERLAY_COLOR = pg.Color("white")
+OVERLAY_BACKGROUND = (0, 0, 0, 180)
+OVERLAY_LINE_HEIGHT = 16
+
+
+def get_allocated_blocks():
+    """Return the number of allocated memory blocks (Python 3.4+ only)."""
+    try:
+        return sys.getallocatedblocks()
+    except AttributeError:
+        return 0
+
+
+class _NullSection(object):
+    """Stands in for a Section while the profiler is disabled."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+NULL_SECTION = _NullSection()
+
+
+class Section(object):
+    """A context manager adding its elapsed time to the current frame."""
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = timeit.default_timer()
+        return self
+
+    def __exit__(self, *args):
+        elapsed = (timeit.default_timer()-self.start)*1000.0
+        self.profiler.add_time(self.name, elapsed)
+        return False
+
+
+class Frame(object):
+    """The measurements of one frame."""
+    def __init__(self, number):
+        self.number = number
+        self.start = timeit.default_timer()
+        self.blocks = get_allocated_blocks()
+        self.total = 0.0
+        self.allocations = 0
+        self.times = collections.defaultdict(float)
+        self.calls = collections.defaultdict(int)
+        self.counts = {}
+
+    def finish(self):
+        """Record the frame's total time and net allocations."""
+        self.total = (timeit.default_timer()-self.start)*1000.0
+        self.allocations = get_allocated_blocks()-self.blocks
+
+    def as_dict(self):
+        """Return the frame as a dictionary for the JSON log."""
+        return {"frame" : self.number,
+                "total" : self.total,
+                "allocations" : self.allocations,
+                "times" : dict(self.times),
+                "calls" : dict(self.calls),
+                "counts" : self.counts}
+
+
+class Profiler(object):
+    """Collects frames while enabled and draws the overlay."""
+    def __init__(self, path=LOG_PATH):
+        self.path = path
+        self.enabled = False
+        self.frames = []
+        self.frame = None
+        self.font = None
+
+    def toggle(self):
+        """Start profiling, or stop and write the log."""
+        if self.enabled:
+            self.stop()
+        else:
+            self.start()
+
+    def start(self):
+        """Discard any old frames and start profiling."""
+        self.enabled = True
+        self.frames = []
+        self.frame = None
+
+    def stop(self):
+        """Stop profiling and write the log (if any frames were recorded)."""
+        self.end_frame()
+        self.enabled = False
+        if self.frames:
+            self.save(self.path)
+
+    def start_frame(self):
+        """Begin a new frame, ending the previous one if needed."""
+        if self.enabled:
+            self.end_frame()
+            self.frame = Frame(len(self.frames))
+
+    def end_frame(self):
+        """Finish the current frame and store it."""
+        if self.enabled and self.frame:
+            self.frame.finish()
+            self.frames.append(self.frame)
+            self.frame = None
+
+    def section(self, name):
+        """Return a context manager timing a section of the frame."""
+        if self.enabled and self.frame:
+            return Section(self, name)
+        return NULL_SECTION
+
+    def add_time(self, name, elapsed):
+        """Add elapsed milliseconds to a section of the current frame."""
+        if self.frame:
+            self.frame.times[name] += elapsed
+            self.frame.calls[name] += 1
+
+    def count(self, name, value):
+        """Record a count (such as a group's sprite count) for the frame."""
+        if self.enabled and self.frame:
+            self.frame.counts[name] = value
+
+    def count_groups(self, group_dict):
+        """Record the number of sprites in each group of group_dict."""
+        if self.enabled and self.frame:
+            for name,group in group_dict.items():
+                if isinstance(group, pg.sprite.AbstractGroup):
+                    self.frame.counts[name] = len(group)
+
+    def save(self, path):
+        """Write the recorded frames to path as JSON or CSV."""
+        if path.lower().endswith(".json"):
+            with open(path, "w") as myfile:
+                json.dump([frame.as_dict() for frame in self.frames], myfile)
+        else:
+            self.save_csv(path)
+
+    def save_csv(self, path):
+        """
+        Write a row per frame: section times (ms) followed by call counts,
+        then sprite counts.
+        """
+        times, counts = set(), set()
+        for frame in self.frames:
+            times.update(frame.times)
+            counts.update(frame.counts)
+        times, counts = sorted(times), sorted(counts)
+        header = ["frame", "total", "allocations"]
+        header += ["{} ms".format(name) for name in times]
+        header += ["{} calls".format(name) for name in times]
+        header += ["{} sprites".format(name) for name in counts]
+        with open(path, "w") as myfile:
+            writer = csv.writer(myfile)
+            writer.writerow(header)
+            for frame in self.frames:
+                row = [frame.number, round(frame.total, 3), frame.allocations]
+                row += [round(frame.times.get(name, 0.0), 3) for name in times]
+                row += [frame.calls.get(name, 0) for name in times]
+                row += [frame.counts.get(name, "") for name in counts]
+                writer.writerow(row)
+
+    def get_overlay_lines(self):
+        """Return the overlay text: averages over recent frames."""
+        recent = self.frames[-OVERLAY_FRAMES:]
+        if not recent:
+            return ["Profiling..."]
+        number = float(len(recent))
+        times = collections.defaultdict(float)
+        for frame in recent:
+            for name,elapsed in frame.times.items():
+                times[name] += elapsed
+        total = sum(frame.total for frame in recent)/number
+        allocations = sum(frame.allocations for frame in recent)/number
+        lines = ["frame: {:.2f} ms".format(total)]
+        for name in sorted(times):
+            lines.append("{}: {:.2f} ms".format(name, times[name]/number))
+        lines.append("allocations: {:.0f}".format(allocations))
+        for name,value in sorted(recent[-1].counts.items()):
+            lines.append("{}: {}".format(name, value))
+        return lines
+
+    def draw(self, surface):
+        """Draw the overlay."""
+        if not self.font:
+            self.font = pg.font.Font(None, 20)
+        lines = self.get_overlay_lines()
+        width = max(self.font.size(line)[0] for line in lines)+10
+        height = len(lines)*OVERLAY_LINE_HEIGHT+10
+        background = pg.Surface((width, height)).convert_alpha()
+        background.fill(OVERLAY_BACKGROUND)
+        surface.blit(background, OVERLAY_POSITION)
+        x, y = OVERLAY_POSITION[0]+5, OVERLAY_POSITION[1]+5
+        for line in lines:
+            surface.blit(self.font.render(line, 1, OVERLAY_COLOR), (x,y))
+            y += OVERLAY_LINE_HEIGHT
+
+
+def timed(name):
+    """Decorator timing every call of a function as a profiler section."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return function(*args, **kwargs)
+            with PROFILER.section(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+PROFILER = Profiler()
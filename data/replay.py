@@ -0,0 +1,250 @@
+"""
+This module records play sessions and replays them deterministically.
+
+A recording starts a new player directly in the Game state (optionally in a
+chosen world and map) and logs the seed given to random, every key event
+with the update (tick) it preceded, the held keys whenever they change, and
+a summary of the game state when the session ends.  Game time comes from a
+synthetic clock that advances one fixed timestep per update, and prefetching
+happens on the main thread, so a replay that feeds the same events back
+through StateMachine.get_event and StateMachine.update reaches the same
+state.  Drawing never changes the simulation (interpolation only moves the
+level's draw rects), but map scrolls normally advance once per drawn frame,
+so while recording they advance every update instead.
+
+Recordings are gzipped JSON.  Replays run headless and report their speed in
+ticks per second and whether the final state matched the recording, so a
+recorded session doubles as a benchmark and a regression test.
+"""
+
+import gzip
+import json
+import random
+import argparse
+
+import pygame as pg
+
+from . import prepare, tools, headless
+from .components import world
+
+
+FORMAT_VERSION = 1
+EVENT_ACTIONS = {pg.KEYDOWN : "down", pg.KEYUP : "up", pg.QUIT : "quit"}
+
+
+class ReplayError(Exception):
+    """Exception thrown for an unreadable or incompatible recording."""
+    pass
+
+
+class Recording(object):
+    """The data of a recorded session."""
+    def __init__(self, seed, world_name=None, coords=None):
+        self.seed = seed
+        self.world = world_name
+        self.coords = coords
+        self.ticks = 0
+        self.events = [] #[tick, action, key] lists.
+        self.keys = [] #[tick, sorted held keys] lists.
+        self.summary = None
+
+    def add_event(self, tick, event):
+        """Log a KEYDOWN, KEYUP or QUIT event that precedes tick."""
+        self.events.append([tick, EVENT_ACTIONS[event.type],
+                            getattr(event, "key", None)])
+
+    def add_keys(self, tick, keys):
+        """Log the held keys at tick if they have changed."""
+        held = sorted(keys.pressed)
+        if not self.keys or self.keys[-1][1] != held:
+            self.keys.append([tick, held])
+
+    def get_script(self):
+        """Return the events as a headless script (tick to list of events)."""
+        script = {}
+        for tick, action, key in self.events:
+            event_type = headless.SCRIPT_ACTIONS[action]
+            if event_type == pg.QUIT:
+                event = pg.event.Event(event_type)
+            else:
+                event = pg.event.Event(event_type, key=key)
+            script.setdefault(tick, []).append(event)
+        return script
+
+    def save(self, path):
+        """Write the recording to path."""
+        data = {"version" : FORMAT_VERSION,
+                "seed" : self.seed,
+                "world" : self.world,
+                "coords" : self.coords,
+                "ticks" : self.ticks,
+                "events" : self.events,
+                "keys" : self.keys,
+                "summary" : self.summary}
+        with gzip.open(path, "wb") as myfile:
+            myfile.write(json.dumps(data, separators=(",",":")).encode())
+
+    @classmethod
+    def load(cls, path):
+        """Read a recording from path."""
+        try:
+            with gzip.open(path, "rb") as myfile:
+                data = json.loads(myfile.read().decode())
+        except (IOError, ValueError) as error:
+            raise ReplayError("Could not read {}: {}".format(path, error))
+        if data.get("version") != FORMAT_VERSION:
+            raise ReplayError("Unsupported recording version.")
+        recording = cls(data["seed"], data["world"], data["coords"])
+        recording.ticks = data["ticks"]
+        recording.events = data["events"]
+        recording.keys = data["keys"]
+        recording.summary = data["summary"]
+        return recording
+
+
+def get_summary(app):
+    """
+    Return a dictionary describing the state of the game.  Compared at the
+    end of a replay to check that it matched the recording.
+    """
+    game = app.state_machine.state_dict["GAME"]
+    player = game.player
+    return {"state" : app.state_machine.state_name,
+            "world" : game.world.name,
+            "coords" : list(game.world.current_coords),
+            "position" : [round(value, 3) for value in player.exact_position],
+            "health" : player.health,
+            "money" : player.inventory["money"],
+            "keys" : player.inventory["keys"],
+            "enemies" : len(game.world.level.enemies)}
+
+
+def start(app, seed, world_name=None, coords=None):
+    """
+    Prepare for a deterministic session: seed random, install the app's
+    synthetic clock, and start a new player in the Game state.
+    """
+    world.THREADED_PREFETCH = False
+    random.seed(seed)
+    tools.set_clock(app.game_clock)
+    new_player = headless.make_player(world_name, coords, "REPLAY")
+    headless.start_game(app, new_player, None)
+
+
+class RecordingControl(tools.Control):
+    """
+    A Control for playing normally while recording.  Rendering runs in real
+    time, but every update advances game time by exactly one timestep.
+    Only key and quit events are passed on (and recorded).
+    """
+    def __init__(self, caption, recording):
+        tools.Control.__init__(self, caption)
+        self.game_clock = tools.SyntheticClock()
+        self.keys = headless.KeyState()
+        self.recording = recording
+        self.ticks = 0
+
+    def update(self):
+        """Advance game time one timestep and update the state."""
+        self.now = self.game_clock.advance()
+        self.state_machine.update(self.keys, self.now)
+        self.ticks += 1
+
+    def event_loop(self):
+        """Pass key and quit events to the state_machine and record them."""
+        for event in pg.event.get():
+            if event.type not in EVENT_ACTIONS:
+                continue
+            if event.type == pg.QUIT:
+                self.done = True
+            else:
+                self.keys.update(event)
+                self.toggle_show_fps(event.key)
+            self.recording.add_event(self.ticks, event)
+            self.state_machine.get_event(event)
+        self.recording.add_keys(self.ticks, self.keys)
+
+    def main(self):
+        """Run the normal game loop until quit, then finish the recording."""
+        lag = 0.0
+        while not (self.done or self.state_machine.done):
+            lag += self.clock.tick(self.fps)
+            self.event_loop()
+            while lag >= tools.TIME_PER_UPDATE:
+                self.update()
+                lag -= tools.TIME_PER_UPDATE
+            self.draw(lag/tools.TIME_PER_UPDATE)
+        self.recording.ticks = self.ticks
+        self.recording.summary = get_summary(self)
+
+
+class ReplayControl(headless.HeadlessControl):
+    """
+    A HeadlessControl that feeds a recording's events and held keys back
+    through the state_machine with a fixed clock.
+    """
+    def __init__(self, caption, recording, render=False):
+        script = recording.get_script()
+        headless.HeadlessControl.__init__(self, caption, script, render)
+        self.game_clock = self.clock
+        self.key_states = {tick:set(keys) for tick,keys in recording.keys}
+
+    def event_loop(self):
+        """Pass this tick's events on, then restore the recorded keys."""
+        for event in self.script.get(self.ticks, ()):
+            if event.type == pg.QUIT:
+                self.done = True
+            self.state_machine.get_event(event)
+        if self.ticks in self.key_states:
+            self.keys.pressed = set(self.key_states[self.ticks])
+
+
+def record(path, seed=None, world_name=None, coords=None):
+    """Play a new session, recording it to path."""
+    if seed is None:
+        seed = random.randrange(2**32)
+    coords = list(coords) if coords else None
+    recording = Recording(seed, world_name, coords)
+    app = RecordingControl(prepare.ORIGINAL_CAPTION, recording)
+    start(app, seed, world_name, coords)
+    app.main()
+    recording.save(path)
+    return recording
+
+
+def replay(path, render=False):
+    """
+    Replay the recording at path.  Returns the ticks per second achieved
+    and whether the final state matched the recording.
+    """
+    recording = Recording.load(path)
+    app = ReplayControl(prepare.ORIGINAL_CAPTION, recording, render)
+    start(app, recording.seed, recording.world, recording.coords)
+    rate = app.main(recording.ticks)
+    return rate, get_summary(app) == recording.summary
+
+
+def record_main():
+    """Command line interface for recording a session."""
+    parser = argparse.ArgumentParser(description="Record a play session.")
+    parser.add_argument("path", help="file to write the recording to")
+    parser.add_argument("--seed", type=int, help="seed for random")
+    parser.add_argument("-w", "--world", help="world file to start in")
+    parser.add_argument("-c", "--coords", type=headless.parse_coords,
+                        help="map coordinates to start at (x,y)")
+    args = parser.parse_args()
+    recording = record(args.path, args.seed, args.world, args.coords)
+    print("Recorded {} ticks to {}.".format(recording.ticks, args.path))
+
+
+def replay_main():
+    """Command line interface for replaying a session."""
+    parser = argparse.ArgumentParser(description="Replay a recorded session.")
+    parser.add_argument("path", help="recording to replay")
+    parser.add_argument("-r", "--render", action="store_true",
+                        help="draw every tick (the display is not updated)")
+    args = parser.parse_args()
+    rate, matched = replay(args.path, args.render)
+    print("Replayed at {:.1f} ticks/sec.".format(rate))
+    print("Final state {}.".format("matched" if matched else "DIFFERED"))
+    return 0 if matched else 1
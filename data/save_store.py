@@ -0,0 +1,274 @@
+"""
+Storage for the player save slots.  Each slot is its own record file, so
+saving one player only writes that player's data.  Records are written to a
+temporary file which is then renamed over the old record; a crash while
+saving leaves the previous record intact and never a half written one.
+
+Record layout:
+    A header line "CABBAGES-SAVE <version> <encoding>" followed by the
+    player data as JSON ("json") or zlib compressed JSON ("binary").
+    Tuples, sets and dictionaries with non-string keys are tagged so that
+    they load back as they were saved.
+
+An empty slot has no record.  Slots are reported as the string "EMPTY" (as
+in the old single file save data, which can be imported once with
+import_legacy).  load_all also reports a damaged record as EMPTY, so one bad
+slot does not hide the others.
+
+An AutoSaver writes snapshots of player data on a worker thread, so that
+saving during play never waits on the disk.
+"""
+
+import os
+import copy
+import json
+import time
+import zlib
+import tempfile
+import threading
+
+from . import yaml_loader
+
+
+SAVE_DIRECTORY = os.path.join("resources", "save_data")
+SLOT_COUNT = 3
+EMPTY = "EMPTY"
+MAGIC = "CABBAGES-SAVE"
+FORMAT_VERSION = 1
+ENCODINGS = ("json", "binary")
+RECORD_NAME = "slot{}.sav"
+#Seconds the autosave worker waits for further requests before writing.
+AUTOSAVE_DELAY = 0.5
+
+#Errors raised while reading a damaged record (json errors are ValueErrors).
+DAMAGED_ERRORS = (ValueError, zlib.error, KeyError, TypeError, IndexError)
+
+_replace = getattr(os, "replace", os.rename) #os.replace is Python 3 only.
+
+
+def encode(value):
+    """Return value with tuples, sets and non-string keys tagged for JSON."""
+    if isinstance(value, tuple):
+        return {"__tuple__" : [encode(item) for item in value]}
+    if isinstance(value, (set, frozenset)):
+        return {"__set__" : [encode(item) for item in value]}
+    if isinstance(value, list):
+        return [encode(item) for item in value]
+    if isinstance(value, dict):
+        if all(isinstance(key, str) for key in value):
+            return {key:encode(item) for key,item in value.items()}
+        items = [[encode(key), encode(item)] for key,item in value.items()]
+        return {"__dict__" : items}
+    return value
+
+
+def decode(value):
+    """Undo encode on loaded JSON data."""
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+    if isinstance(value, dict):
+        if "__tuple__" in value:
+            return tuple(decode(item) for item in value["__tuple__"])
+        if "__set__" in value:
+            return set(decode(item) for item in value["__set__"])
+        if "__dict__" in value:
+            return {decode(key):decode(item) for key,item in value["__dict__"]}
+        return {str(key):decode(item) for key,item in value.items()}
+    return value
+
+
+class SaveStore(object):
+    """
+    The save slots in a directory.  New records use the store's encoding;
+    records in any supported encoding can be read.
+    """
+    def __init__(self, directory=SAVE_DIRECTORY, encoding="json",
+                 slots=SLOT_COUNT):
+        if encoding not in ENCODINGS:
+            raise ValueError("Unknown save encoding: {}".format(encoding))
+        self.directory = directory
+        self.encoding = encoding
+        self.slots = slots
+
+    def get_path(self, slot):
+        """Return the path of the record for slot."""
+        if not 0 <= slot < self.slots:
+            raise IndexError("No save slot {}".format(slot))
+        return os.path.join(self.directory, RECORD_NAME.format(slot))
+
+    def load(self, slot):
+        """
+        Return the player data saved in slot, or EMPTY.  Raises ValueError
+        if the record is not a save or from an unknown format version; other
+        damage may raise any of DAMAGED_ERRORS.
+        """
+        try:
+            with open(self.get_path(slot), "rb") as myfile:
+                header = myfile.readline().decode("ascii", "replace").split()
+                payload = myfile.read()
+        except (IOError, OSError):
+            return EMPTY
+        if len(header) != 3 or header[0] != MAGIC:
+            raise ValueError("Save slot {} is not a save record".format(slot))
+        if header[1] != str(FORMAT_VERSION) or header[2] not in ENCODINGS:
+            message = "Save slot {} has unsupported format {} {}"
+            raise ValueError(message.format(slot, header[1], header[2]))
+        if header[2] == "binary":
+            payload = zlib.decompress(payload)
+        return decode(json.loads(payload.decode("utf-8")))
+
+    def load_all(self):
+        """
+        Return a list of the data (or EMPTY) in every slot.  Damaged records
+        are reported as EMPTY.
+        """
+        players = []
+        for slot in range(self.slots):
+            try:
+                players.append(self.load(slot))
+            except DAMAGED_ERRORS:
+                players.append(EMPTY)
+        return players
+
+    def save(self, slot, data):
+        """
+        Write data as the record of slot.  The record is replaced in one
+        step, so it is never seen partly written.
+        """
+        path = self.get_path(slot)
+        text = json.dumps(encode(data), sort_keys=True)
+        if self.encoding == "binary":
+            payload = zlib.compress(text.encode("utf-8"))
+        else:
+            payload = (text+"\n").encode("utf-8")
+        header = "{} {} {}\n".format(MAGIC, FORMAT_VERSION, self.encoding)
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        handle, temp_path = tempfile.mkstemp(".tmp", "slot", self.directory)
+        try:
+            with os.fdopen(handle, "wb") as myfile:
+                myfile.write(header.encode("ascii"))
+                myfile.write(payload)
+                myfile.flush()
+                os.fsync(myfile.fileno())
+            _replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def clear(self, slot):
+        """Empty slot by removing its record."""
+        try:
+            os.remove(self.get_path(slot))
+        except OSError:
+            pass
+
+    def import_legacy(self, path):
+        """
+        Copy the players in an old single file save (a YAML list of player
+        data or EMPTY) into the empty slots of this store.  The old file is
+        renamed afterwards so it is only imported once.  Returns the number
+        of players imported; a missing or malformed file imports nothing.
+        """
+        try:
+            players = yaml_loader.load_file(path)
+        except (IOError, OSError, yaml_loader.yaml.YAMLError):
+            return 0
+        if not isinstance(players, list):
+            return 0
+        current = self.load_all()
+        imported = 0
+        for slot,data in enumerate(players[:self.slots]):
+            if data != EMPTY and current[slot] == EMPTY:
+                self.save(slot, data)
+                imported += 1
+        if imported:
+            _replace(path, path+".imported")
+        return imported
+
+
+class AutoSaver(object):
+    """
+    Saves snapshots of player data to a SaveStore on a worker thread.  Data
+    is copied when the save is requested.  Requests for a slot that arrive
+    before the worker writes it are coalesced; only the newest is written.
+    If threaded is False snapshots are saved immediately instead.
+    """
+    def __init__(self, store, threaded=True, delay=AUTOSAVE_DELAY):
+        self.store = store
+        self.threaded = threaded
+        self.delay = delay
+        self.pending = {} #Slot to the newest unwritten snapshot.
+        self.requested = 0.0 #Time of the latest request.
+        self.writing = False
+        self.flushing = False
+        self.condition = threading.Condition()
+        self.worker = None
+
+    def request(self, slot, data):
+        """Save a snapshot of data to slot in the background."""
+        snapshot = copy.deepcopy(data)
+        if not self.threaded:
+            self.store.save(slot, snapshot)
+            return
+        with self.condition:
+            if not self.worker_alive():
+                self.worker = threading.Thread(target=self.save_worker)
+                self.worker.daemon = True
+                self.worker.start()
+            self.pending[slot] = snapshot
+            self.requested = time.time()
+            self.condition.notify_all()
+
+    def save_worker(self):
+        """
+        Worker thread loop.  Once requests stop arriving for delay seconds
+        (or a flush is waiting), write every pending snapshot.
+        """
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                while not self.flushing:
+                    remaining = self.requested+self.delay-time.time()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                pending, self.pending = self.pending, {}
+                self.writing = True
+            try:
+                self.save_snapshots(pending)
+            finally:
+                with self.condition:
+                    self.writing = False
+                    self.condition.notify_all()
+
+    def save_snapshots(self, pending):
+        """
+        Save each snapshot in the dictionary pending.  Failed saves are
+        reported and dropped (the next request for the slot retries), so one
+        bad snapshot never stops the others or the worker.
+        """
+        for slot,data in sorted(pending.items()):
+            try:
+                self.store.save(slot, data)
+            except Exception as error:
+                print("Autosave of slot {} failed: {}".format(slot, error))
+
+    def worker_alive(self):
+        """Return True if the worker thread is running."""
+        return self.worker is not None and self.worker.is_alive()
+
+    def flush(self):
+        """
+        Write any pending snapshots now and wait until they are saved.  If
+        there is no live worker the snapshots are saved on this thread.
+        """
+        with self.condition:
+            self.flushing = True
+            self.condition.notify_all()
+            while (self.pending or self.writing) and self.worker_alive():
+                self.condition.wait(self.delay)
+            pending, self.pending = self.pending, {}
+            self.flushing = False
+        self.save_snapshots(pending)
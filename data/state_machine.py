@@ -13,6 +13,7 @@ class StateMachine(object):
         self.state_name = None
         self.state = None
         self.now = None
+        self.loader = None #Called with a state's preload list at startup.
 
     def setup_states(self, state_dict, start_state):
         """
@@ -22,6 +23,7 @@ class StateMachine(object):
         self.state_dict = state_dict
         self.state_name = start_state
         self.state = self.state_dict[self.state_name]
+        self.preload(self.state)
 
     def update(self, keys, now):
         """
@@ -36,7 +38,10 @@ class StateMachine(object):
         self.state.update(keys, now)
 
     def draw(self, surface, interpolate):
-        self.state.draw(surface, interpolate)
+        """
+        Draw the current State; return its list of changed rects (if any).
+        """
+        return self.state.draw(surface, interpolate)
 
     def flip_state(self):
         """
@@ -46,9 +51,18 @@ class StateMachine(object):
         previous, self.state_name = self.state_name, self.state.next
         persist = self.state.cleanup()
         self.state = self.state_dict[self.state_name]
+        self.preload(self.state)
         self.state.startup(self.now, persist)
         self.state.previous = previous
 
+    def preload(self, state):
+        """
+        Pass the resources the state lists in its preload attribute to the
+        loader (if one is set) so that they are ready when it starts up.
+        """
+        if self.loader and state.preload:
+            self.loader(state.preload)
+
     def get_event(self, event):
         """
         Pass events down to current State.
@@ -71,6 +85,7 @@ class _State(object):
         self.next = None
         self.previous = None
         self.persist = {}
+        self.preload = []
 
     def get_event(self, event):
         """
@@ -57,6 +57,7 @@ class Camp(state_machine._State):
     """State for changing gear, selecting items, etc."""
     def __init__(self):
         state_machine._State.__init__(self)
+        self.preload = [("misc", "campscreen"), ("misc", "charcreate")]
         self.scroll_speed = 20
         self.next = "GAME"
         self.state_machine = state_machine.StateMachine()
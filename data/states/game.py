@@ -2,18 +2,11 @@
 This module contains the primary gameplay state.
 """
 
-import sys
 import math
 import pygame as pg
 
-from .. import prepare, state_machine, menu_helpers
-from ..components import player, world, sidebar, enemy_sprites
-
-
-if sys.version_info[0] < 3:
-    import yaml
-else:
-    import yaml3 as yaml
+from .. import prepare, state_machine, menu_helpers, profiler
+from ..components import player, world, sidebar, enemy_sprites, level_cache
 
 
 SMALL_FONT = pg.font.Font(prepare.FONTS["Fixedsys500c"], 32) ###
@@ -33,19 +26,25 @@ class Game(state_machine._State):
     """Core state for the actual gameplay."""
     def __init__(self):
         state_machine._State.__init__(self)
+        self.preload = [("misc", "healthsheet"), ("misc", "sidebargfx")]
         self.world = None
+        self.level_cache = level_cache.LevelCache()
         self.reset_map = True
 
     def startup(self, now, persistant):
         """
         Call the parent class' startup method.
-        If reset_map has been set (after player death etc.) recreate the world
-        map and reset relevant variables.
+        If reset_map has been set (after player death etc.) empty the level
+        cache, recreate the world map and reset relevant variables.
         """
         state_machine._State.startup(self, now, persistant)
+        self.redraw_all = True
         if self.reset_map:
             self.player = self.persist["player"]
-            self.world = world.WorldMap(self.player)
+            if self.world:
+                self.world.close()
+            self.level_cache.clear()
+            self.world = world.WorldMap(self.player, self.level_cache)
             self.sidebar = sidebar.SideBar()
             self.iris = None
             self.play_again = None
@@ -60,19 +59,14 @@ class Game(state_machine._State):
 
     def save_player(self):
         """
-        Retrieve needed data and save it in the player's save slot using YAML.
+        Retrieve needed data and save it in the player's save slot.  The
+        data is written in the background (see prepare.AUTOSAVE).
+        A save_slot of None (used by replays) disables saving.
         """
-        data = self.player.get_player_data()
-        try:
-            with open(prepare.SAVE_PATH) as my_file:
-                players = yaml.load(my_file)
-        except IOError:
-            print("Problem loading data. Exiting.")
-            raise
         save_slot = self.persist["save_slot"]
-        players[save_slot] = data
-        with open(prepare.SAVE_PATH, 'w') as my_file:
-            yaml.dump(players, my_file)
+        if save_slot is None:
+            return
+        prepare.AUTOSAVE.request(save_slot, self.player.get_player_data())
 
     def get_event(self, event):
         """
@@ -112,19 +106,43 @@ class Game(state_machine._State):
         if self.player.world_change:
             self.change_world()
         self.world.update(now)
+        if self.player.checkpoint:
+            self.autosave()
         self.sidebar.update(self.player)
         if self.player.action_state == "dead":
             self.update_on_death(keys, now)
 
+    def autosave(self):
+        """
+        Save the player at a checkpoint (map change, chest opened or portal
+        used).  Headless runs don't autosave, so that bot players are not
+        written over real save slots.
+        """
+        self.player.checkpoint = False
+        if not prepare.HEADLESS:
+            self.save_player()
+
     def change_world(self):
-        self.world = world.WorldMap(self.player)
+        self.world.close()
+        self.world = world.WorldMap(self.player, self.level_cache)
         pos = (self.player.start_coord[0]*prepare.CELL_SIZE[0],
             self.player.start_coord[1]*prepare.CELL_SIZE[1])
         self.player.reset_position(pos)
         self.player.world_change = False
 
     def draw(self, surface, interpolate):
-        """Draw level and sidebar; if player is dead draw death sequence."""
+        """
+        Draw level and sidebar; if player is dead draw death sequence.
+        If prepare.DIRTY_RECTS is set only changed areas are drawn and their
+        rects returned, except during map scrolls, the death iris, and
+        profiling (the overlay is drawn over the level) which update the
+        whole display.
+        """
+        dead = self.player.action_state == "dead" and self.iris
+        full = self.world.scrolling or dead or profiler.PROFILER.enabled
+        if prepare.DIRTY_RECTS and not full:
+            return self.draw_dirty(surface, interpolate)
+        self.redraw_all = True
         self.world.draw(surface, interpolate)
         self.sidebar.draw(surface, interpolate)
         if self.player.action_state == "dead" and self.iris:
@@ -132,6 +150,16 @@ class Game(state_machine._State):
             if self.iris.done:
                 self.play_again.draw(surface, interpolate)
 
+    def draw_dirty(self, surface, interpolate):
+        """Draw changed areas of the level and sidebar; return their rects."""
+        full = self.redraw_all
+        self.redraw_all = False
+        dirty = self.world.draw_dirty(surface, interpolate, full)
+        if dirty is None:
+            return None
+        dirty.extend(self.sidebar.draw_dirty(surface, full))
+        return dirty
+
     def update_on_death(self, keys, now):
         """
         If the player has been killed this method will be called during the
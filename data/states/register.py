@@ -3,19 +3,12 @@ Contains class for creating a new player and registering their name.
 """
 
 import os
-import sys
 import copy
 import pygame as pg
 
 from .. import prepare, tools, menu_helpers
 
 
-if sys.version_info[0] < 3:
-    import yaml
-else:
-    import yaml3 as yaml
-
-
 FONT = pg.font.Font(prepare.FONTS["Fixedsys500c"], 60) ###
 
 MAX_LETTERS = 8
@@ -45,6 +38,7 @@ class Register(menu_helpers.BidirectionalMenu):
     """
     def __init__(self):
         menu_helpers.BidirectionalMenu.__init__(self, ALPHA_GRID_SIZE)
+        self.preload = [("misc", "register")]
         self.next = "SELECT"
         self.timer = tools.Timer(333)
         self.blink = True
@@ -62,20 +56,11 @@ class Register(menu_helpers.BidirectionalMenu):
 
     def save_new(self):
         """
-        Save newly created player to the save data file.
-        If the file doesn't exist it will be created.
+        Save newly created player to their save slot.
         """
         player_data = copy.deepcopy(prepare.DEFAULT_PLAYER)
         player_data["name"] = "".join(self.name)
-        try:
-            with open(prepare.SAVE_PATH) as my_file:
-                players = yaml.load(my_file)
-        except IOError:
-            players = ["EMPTY", "EMPTY", "EMPTY"]
-        save_slot = self.persist["save_slot"]
-        players[save_slot] = player_data
-        with open(prepare.SAVE_PATH, 'w') as my_file:
-            yaml.dump(players, my_file)
+        prepare.SAVES.save(self.persist["save_slot"], player_data)
 
     def pressed_enter(self):
         """Called if the user selects an item with the enter key(s)."""
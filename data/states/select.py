@@ -3,19 +3,12 @@ Contains classes used for the player selection screen.
 """
 
 import os
-import sys
 import pygame as pg
 
-from .. import prepare, tools, state_machine, menu_helpers
+from .. import prepare, tools, state_machine, menu_helpers, save_store
 from ..components import enemy_sprites, player
 
 
-if sys.version_info[0] < 3:
-    import yaml
-else:
-    import yaml3 as yaml
-
-
 FONT = pg.font.Font(prepare.FONTS["Fixedsys500c"], 60) ###
 SMALL_FONT = pg.font.Font(prepare.FONTS["Fixedsys500c"], 32) ###
 
@@ -45,6 +38,8 @@ class Select(state_machine._State):
     """
     def __init__(self):
         state_machine._State.__init__(self)
+        self.preload = [("misc", "charcreate"), ("misc", "sidebargfx"),
+                        ("misc", "icons"), ("misc", "delete")]
         self.next = "GAME"
         self.timeout = 15
         self.cabbages = pg.sprite.Group(MenuCabbage(25, 225, (25,525), 1.7),
@@ -105,7 +100,7 @@ class Select(state_machine._State):
         Get events from Control.
         """
         if event.type == pg.KEYDOWN:
-            self.start_time = pg.time.get_ticks()
+            self.start_time = tools.get_ticks()
         self.state_machine.get_event(event)
 
 
@@ -124,7 +119,7 @@ class SelectState(menu_helpers.BasicMenu):
             if player_sprite.image and not player_sprite.redraw:
                 player_sprite.redraw = redraw
             player_sprite.direction = "front"
-            player_sprite.adjust_frames(pg.time.get_ticks())
+            player_sprite.adjust_frames(tools.get_ticks())
             expand = pg.transform.scale(player_sprite.image, (100,100))
             player_sprite.direction = player_sprite.start_direction ###
             player_sprite.redraw = redraw ###
@@ -175,17 +170,17 @@ class Options(SelectState):
 
     def load_players(self):
         """
-        Load player data.  If no data is find create three empty slots.
+        Load player data, waiting for any autosaves still being written.
+        Slots without a saved player, or whose data is damaged, are "EMPTY".
         """
-        players = ["EMPTY", "EMPTY", "EMPTY"]
-        try:
-            with open(prepare.SAVE_PATH) as my_file:
-                data = yaml.load(my_file)
-            for i,play_data in enumerate(data):
-                if play_data != "EMPTY":
+        prepare.AUTOSAVE.flush()
+        players = prepare.SAVES.load_all()
+        for i,play_data in enumerate(players):
+            if play_data != "EMPTY":
+                try:
                     players[i] = player.Player(play_data)
-        except IOError:
-            pass
+                except save_store.DAMAGED_ERRORS:
+                    players[i] = "EMPTY"
         return players
 
     def make_player_names(self):
@@ -354,15 +349,9 @@ class Confirm(SelectState):
 
     def save_change(self):
         """
-        Overwrite the save data of the player with
-        the string EMPTY.
+        Clear the save slot of the deleted player.
         """
-        with open(prepare.SAVE_PATH) as my_file:
-            data = yaml.load(my_file)
-        del_index = self.persist["del_index"]
-        data[del_index] = "EMPTY"
-        with open(prepare.SAVE_PATH, 'w') as my_file:
-            yaml.dump(data, my_file)
+        prepare.SAVES.clear(self.persist["del_index"])
 
     def pressed_enter(self):
         """
@@ -419,7 +408,7 @@ class MenuCabbage(enemy_sprites.Cabbage):
         if not (self.min <= self.rect.x <= self.max):
             self.speed *= -1
             self.rect.x = min(max(self.rect.x, self.min), self.max)
-            self.exact_position = list(self.rect.topleft)
+            self.exact_position[:] = self.rect.topleft
 
     def draw(self, surface, interpolate):
         speed = self.speed*interpolate
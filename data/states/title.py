@@ -156,7 +156,7 @@ class Star(pg.sprite.Sprite):
         self.image = self.frames[self.frame]
         self.rect = self.image.get_rect(center=pos)
         self.blink_timer = tools.Timer(100)
-        self.blink_timer.check_tick(pg.time.get_ticks())
+        self.blink_timer.check_tick(tools.get_ticks())
         self.delay = random.randrange(200, 3000)
         self.delay_timer = 0.0
         self.animate = random.random() < 0.1
@@ -10,6 +10,7 @@ class ViewControls(state_machine._State):
     """This State is updated while our game shows the player select screen."""
     def __init__(self):
         state_machine._State.__init__(self)
+        self.preload = [("misc", "keyboard")]
         self.next = "SELECT"
         self.timer = tools.Timer(300)
         self.blink = False
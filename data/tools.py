@@ -6,10 +6,21 @@ Also contained here are resource loading functions.
 import os
 import pygame as pg
 
+from multiprocessing.pool import ThreadPool
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
 from . import state_machine
+from .profiler import PROFILER
 
 
 TIME_PER_UPDATE = 16.0  #Milliseconds
+LOADER_THREADS = None #Threads used by load_parallel; None uses the CPU count.
+
+_clock = None #A SyntheticClock replacing real time; see set_clock.
 
 
 class Control(object):
@@ -32,19 +43,33 @@ class Control(object):
         """
         Updates the currently active state.
         """
-        self.now = pg.time.get_ticks()
+        self.now = get_ticks()
         self.state_machine.update(self.keys, self.now)
 
     def draw(self, interpolate):
+        """
+        Draw the current state.  States may return a list of the rects they
+        changed, in which case only those rects are updated on the display;
+        otherwise (a return of None) the whole display is updated.
+        """
         if not self.state_machine.state.done:
-            self.state_machine.draw(self.screen, interpolate)
-            pg.display.update()
+            with PROFILER.section("draw"):
+                dirty = self.state_machine.draw(self.screen, interpolate)
+            if PROFILER.enabled:
+                PROFILER.draw(self.screen)
+                dirty = None
+            with PROFILER.section("display.update"):
+                if dirty is None:
+                    pg.display.update()
+                else:
+                    pg.display.update(dirty)
             self.show_fps()
 
     def event_loop(self):
         """
         Process all events and pass them down to the state_machine.
-        The f5 key globally turns on/off the display of FPS in the caption
+        The f5 key globally turns on/off the display of FPS in the caption;
+        the f6 key turns the profiler on/off.
         """
         for event in pg.event.get():
             if event.type == pg.QUIT:
@@ -52,6 +77,7 @@ class Control(object):
             elif event.type == pg.KEYDOWN:
                 self.keys = pg.key.get_pressed()
                 self.toggle_show_fps(event.key)
+                self.toggle_profiler(event.key)
             elif event.type == pg.KEYUP:
                 self.keys = pg.key.get_pressed()
             self.state_machine.get_event(event)
@@ -63,6 +89,14 @@ class Control(object):
             if not self.fps_visible:
                 pg.display.set_caption(self.caption)
 
+    def toggle_profiler(self, key):
+        """
+        Press f6 to start profiling (showing the overlay), and again to stop
+        and write the log.
+        """
+        if key == pg.K_F6:
+            PROFILER.toggle()
+
     def show_fps(self):
         """
         Display the current FPS in the window handle if fps_visible is True.
@@ -77,15 +111,58 @@ class Control(object):
         lag = 0.0
         while not self.done:
             lag += self.clock.tick(self.fps)
-            self.event_loop()
+            PROFILER.start_frame()
+            with PROFILER.section("event_loop"):
+                self.event_loop()
             while lag >= TIME_PER_UPDATE:
-                self.update()
+                with PROFILER.section("update"):
+                    self.update()
                 lag -= TIME_PER_UPDATE
             self.draw(lag/TIME_PER_UPDATE)
+            PROFILER.end_frame()
+        if PROFILER.enabled:
+            PROFILER.stop()
+
+
+class SyntheticClock(object):
+    """
+    A clock that only advances when told to.  Installed with set_clock when
+    the game loop is stepped independently of real time (headless runs and
+    replays), so that every update sees exactly one fixed timestep pass.
+    """
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def advance(self, milliseconds=TIME_PER_UPDATE):
+        """Move time forward and return the new time."""
+        self.now += milliseconds
+        return self.now
+
+
+def set_clock(clock):
+    """
+    Install a SyntheticClock as the source of get_ticks.  Pass None to return
+    to real time.
+    """
+    global _clock
+    _clock = clock
+
+
+def get_ticks():
+    """
+    Return the current time in milliseconds.  Game code should use this
+    rather than pg.time.get_ticks so that a synthetic clock can replace it.
+    """
+    if _clock is not None:
+        return _clock.now
+    return pg.time.get_ticks()
 
 
 class Anim(object):
     """A class to simplify the act of adding animations to sprites."""
+    __slots__ = ("frames", "fps", "frame", "timer", "loops", "loop_count",
+                 "done")
+
     def __init__(self, frames, fps, loops=-1):
         """
         The argument frames is a list of frames in the correct order;
@@ -130,6 +207,8 @@ class Timer(object):
     """
     A very simple timer for events that are not directly tied to animation.
     """
+    __slots__ = ("delay", "ticks", "tick_count", "timer", "done")
+
     def __init__(self, delay, ticks=-1):
         """
         The delay is given in milliseconds; ticks is the number of ticks the
@@ -158,6 +237,8 @@ class Timer(object):
 class _BaseSprite(pg.sprite.Sprite):
     """
     A very basic base class that contains some commonly used functionality.
+    The exact_position and old_position lists are created once and then
+    updated in place.
     """
     def __init__(self, pos, size, *groups):
         pg.sprite.Sprite.__init__(self, *groups)
@@ -165,15 +246,6 @@ class _BaseSprite(pg.sprite.Sprite):
         self.exact_position = list(self.rect.topleft)
         self.old_position = self.exact_position[:]
 
-    @property
-    def frame_speed(self):
-        """
-        Returns the total displacement undergone in a frame. Used for the
-        interpolation of the sprite's location in the draw phase.
-        """
-        return (self.exact_position[0]-self.old_position[0],
-                self.exact_position[1]-self.old_position[1])
-
     def reset_position(self, value, attribute="topleft"):
         """
         Set the sprite's location variables to a new point.  The attribute
@@ -181,8 +253,8 @@ class _BaseSprite(pg.sprite.Sprite):
         sprite's rect.
         """
         setattr(self.rect, attribute, value)
-        self.exact_position = list(self.rect.topleft)
-        self.old_position = self.exact_position[:]
+        self.exact_position[:] = self.rect.topleft
+        self.old_position[:] = self.exact_position
 
     def draw(self, surface):
         surface.blit(self.image, self.rect)
@@ -192,6 +264,32 @@ class _BaseSprite(pg.sprite.Sprite):
 
 
 ### Resource loading functions.
+def find_files(directory, accept):
+    """
+    Return a list of (name, path) pairs for the files in directory with
+    extensions in accept.  The name is the file name without its extension.
+    """
+    found = []
+    for filename in sorted(os.listdir(directory)):
+        name,ext = os.path.splitext(filename)
+        if ext.lower() in accept:
+            found.append((name, os.path.join(directory,filename)))
+    return found
+
+
+def convert_image(img, colorkey=(255,0,255)):
+    """
+    Convert a loaded image for fast blitting.  If alpha transparency is found
+    the image is converted using convert_alpha(); otherwise it is converted
+    using convert() and colorkey is set.  Requires the display to be set.
+    """
+    if img.get_alpha():
+        return img.convert_alpha()
+    img = img.convert()
+    img.set_colorkey(colorkey)
+    return img
+
+
 def load_all_gfx(directory,colorkey=(255,0,255),accept=(".png",".jpg",".bmp")):
     """
     Load all graphics with extensions in the accept argument.  If alpha
@@ -200,19 +298,75 @@ def load_all_gfx(directory,colorkey=(255,0,255),accept=(".png",".jpg",".bmp")):
     converted using convert() and colorkey will be set to colorkey.
     """
     graphics = {}
-    for pic in os.listdir(directory):
-        name,ext = os.path.splitext(pic)
-        if ext.lower() in accept:
-            img = pg.image.load(os.path.join(directory,pic))
-            if img.get_alpha():
-                img = img.convert_alpha()
-            else:
-                img = img.convert()
-                img.set_colorkey(colorkey)
-            graphics[name]=img
+    for name,path in find_files(directory, accept):
+        graphics[name] = convert_image(pg.image.load(path), colorkey)
     return graphics
 
 
+class LazyGraphics(Mapping):
+    """
+    A read only mapping of image names to the graphics of one directory.
+    Each file is loaded and converted (see convert_image) the first time its
+    name is looked up, so only the graphics that are actually used are ever
+    decoded or kept in memory.  Images decoded elsewhere (such as by
+    load_parallel) can be handed over with store.
+    """
+    def __init__(self, directory, colorkey=(255,0,255),
+                 accept=(".png",".jpg",".bmp")):
+        self.directory = directory
+        self.colorkey = colorkey
+        self.paths = dict(find_files(directory, accept))
+        self.loaded = {}
+
+    def __getitem__(self, name):
+        if name not in self.loaded:
+            self.store(name, pg.image.load(self.paths[name]))
+        return self.loaded[name]
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __contains__(self, name):
+        return name in self.paths
+
+    def is_loaded(self, name):
+        """Check if the named image has already been loaded."""
+        return name in self.loaded
+
+    def store(self, name, image):
+        """Convert an image loaded from the named file and keep it."""
+        self.loaded[name] = convert_image(image, self.colorkey)
+
+
+def _run_load_job(job):
+    """Call a job's loader on its path; run on a worker of load_parallel."""
+    key, loader, path = job
+    return key, loader(path)
+
+
+def load_parallel(jobs, threads=LOADER_THREADS):
+    """
+    Run loader(path) for each (key, loader, path) tuple in jobs on a pool of
+    threads, yielding (key, result) pairs on the calling thread as they
+    finish (in no particular order).  pygame releases the GIL while it
+    decodes image and sound files, so pg.image.load and pg.mixer.Sound
+    proceed in parallel; work that needs the display, such as convert, must
+    be done by the caller on the main thread.
+    """
+    if not jobs:
+        return
+    pool = ThreadPool(threads)
+    try:
+        for result in pool.imap_unordered(_run_load_job, jobs):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
 def load_all_music(directory, accept=(".wav",".mp3",".ogg",".mdi")):
     """
     Create a dictionary of paths to music files in given directory
@@ -241,10 +395,8 @@ def load_all_sfx(directory, accept=(".wav",".mp3",".ogg",".mdi")):
     manually if necessary.
     """
     effects = {}
-    for fx in os.listdir(directory):
-        name,ext = os.path.splitext(fx)
-        if ext.lower() in accept:
-            effects[name] = pg.mixer.Sound(os.path.join(directory,fx))
+    for name,path in find_files(directory, accept):
+        effects[name] = pg.mixer.Sound(path)
     return effects
 
 
@@ -0,0 +1,221 @@
+"""
+Loading and saving of the game's YAML data (maps, worlds and save files).
+The LibYAML based CLoader and CDumper are used when the _yaml extension can
+be imported and works with the bundled yaml package; otherwise the pure
+Python Loader and Dumper are used.  Both are full (not safe) loaders, so
+the !!python/tuple tags in the data files still construct tuples.
+
+Without LibYAML, text that the bundled FastLoader accepts (a whole string
+with only newline line breaks) is loaded with it.  It produces the same
+events as the Python Loader; check_conformance verifies this for every
+data file.
+
+Run benchmark_yaml.py to compare the loaders on every shipped map, or
+benchmark_yaml.py --check to run the conformance check.
+"""
+
+import os
+import sys
+import timeit
+import argparse
+
+if sys.version_info[0] < 3:
+    import yaml
+else:
+    import yaml3 as yaml
+
+
+RESOURCE_DIRECTORY = os.path.join(".", "resources")
+MAP_DIRECTORY = os.path.join(RESOURCE_DIRECTORY, "map_data")
+DATA_TYPES = (".map", ".wrl", ".dat")
+BENCHMARK_REPEATS = 5
+_SAMPLE = {(50, 100) : ["base", (0, 50)]} #Checks tuple construction.
+
+
+def libyaml_works():
+    """
+    Check that CLoader and CDumper exist and round trip data with tuples.
+    The _yaml extension may belong to a different yaml install, in which
+    case it can import but can not be used with the bundled package.
+    """
+    try:
+        text = yaml.dump(_SAMPLE, Dumper=yaml.CDumper)
+        return yaml.load(text, Loader=yaml.CLoader) == _SAMPLE
+    except (AttributeError, TypeError, yaml.YAMLError):
+        return False
+
+
+WITH_LIBYAML = libyaml_works()
+LOADER = yaml.CLoader if WITH_LIBYAML else yaml.Loader
+DUMPER = yaml.CDumper if WITH_LIBYAML else yaml.Dumper
+FAST_LOADER = getattr(yaml, "FastLoader", None)
+
+
+def get_loader(text):
+    """Return the fastest loader that can read the string text."""
+    if not WITH_LIBYAML and FAST_LOADER and FAST_LOADER.accepts(text):
+        return FAST_LOADER
+    return LOADER
+
+
+def load(stream, loader=None):
+    """
+    Parse the YAML document in stream (a file or string).  Files are read
+    in full so the fast loader can be used if no loader is given.
+    """
+    if loader is None:
+        if hasattr(stream, "read"):
+            stream = stream.read()
+        loader = get_loader(stream)
+    return yaml.load(stream, Loader=loader)
+
+
+def dump(data, stream=None):
+    """Write data as YAML to stream (or return it as a string if None)."""
+    return yaml.dump(data, stream, Dumper=DUMPER)
+
+
+def load_file(path, loader=None):
+    """Load the YAML file at path."""
+    with open(path) as myfile:
+        return load(myfile, loader)
+
+
+def dump_file(data, path):
+    """Write data to the YAML file at path."""
+    with open(path, "w") as myfile:
+        dump(data, myfile)
+
+
+def find_data_files(directory=RESOURCE_DIRECTORY, accept=DATA_TYPES):
+    """Return the paths of all YAML data files under directory, sorted."""
+    paths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.endswith(accept):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def get_events(text, loader):
+    """
+    Return the parse events of text as comparable tuples, including the
+    index, line and column of their marks.
+    """
+    events = []
+    for event in yaml.parse(text, Loader=loader):
+        marks = []
+        for mark in (event.start_mark, event.end_mark):
+            marks.append((mark.index, mark.line, mark.column))
+        attributes = []
+        for name in ("anchor", "tag", "implicit", "value", "style",
+                     "flow_style"):
+            attributes.append(getattr(event, name, None))
+        events.append((type(event).__name__, tuple(attributes), marks))
+    return events
+
+
+def check_conformance(directory=RESOURCE_DIRECTORY):
+    """
+    Check that the fast loader produces the same event stream as the Python
+    Loader for every data file under directory.  Returns the number of files
+    checked and a list of the files skipped because the fast loader does not
+    accept them; raises ValueError naming the first file and event that
+    differ.
+    """
+    if FAST_LOADER is None:
+        raise ValueError("This yaml package has no fast loader.")
+    checked = 0
+    skipped = []
+    for path in find_data_files(directory):
+        with open(path) as myfile:
+            text = myfile.read()
+        if not FAST_LOADER.accepts(text):
+            skipped.append(path)
+            continue
+        checked += 1
+        expected = get_events(text, yaml.Loader)
+        found = get_events(text, FAST_LOADER)
+        for i,(event, fast_event) in enumerate(zip(expected, found)):
+            if event != fast_event:
+                message = "{}: event {} differs:\n  {}\n  {}"
+                raise ValueError(message.format(path, i, event, fast_event))
+        if len(expected) != len(found):
+            raise ValueError("{}: event counts differ".format(path))
+    return checked, skipped
+
+
+def time_load(text, loader, repeats):
+    """Return the best time of repeats loads of text with loader."""
+    return min(timeit.repeat(lambda: load(text, loader),
+                             number=1, repeat=repeats))
+
+
+def benchmark(directory=MAP_DIRECTORY, repeats=BENCHMARK_REPEATS):
+    """
+    Time loading every map in directory with the pure Python Loader, the
+    fast loader and CLoader (when each is usable).  Returns a list of
+    (map name, python seconds, fast seconds, C seconds) with the best of
+    repeats for each; unusable loaders give None.  Raises ValueError if the
+    loaders disagree on a map.
+    """
+    results = []
+    for map_name in sorted(os.listdir(directory)):
+        if not map_name.endswith(".map"):
+            continue
+        with open(os.path.join(directory, map_name)) as myfile:
+            text = myfile.read()
+        expected = load(text, yaml.Loader)
+        python_time = time_load(text, yaml.Loader, repeats)
+        times = []
+        usable = [FAST_LOADER and FAST_LOADER.accepts(text), WITH_LIBYAML]
+        for loader,use in zip(("FastLoader", "CLoader"), usable):
+            if not use:
+                times.append(None)
+                continue
+            loader = getattr(yaml, loader)
+            if load(text, loader) != expected:
+                raise ValueError("Loaders disagree on {}".format(map_name))
+            times.append(time_load(text, loader, repeats))
+        results.append((map_name, python_time) + tuple(times))
+    return results
+
+
+def main():
+    """Command line interface for the loader benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark YAML loading.")
+    parser.add_argument("-r", "--repeats", type=int,
+                        default=BENCHMARK_REPEATS,
+                        help="loads of each map (the best is reported)")
+    parser.add_argument("-c", "--check", action="store_true",
+                        help="check the fast loader against the Python "
+                             "loader on every data file instead")
+    args = parser.parse_args()
+    if args.check:
+        checked, skipped = check_conformance()
+        print("Fast loader events match on {} data files.".format(checked))
+        if skipped:
+            print("Skipped {} files the fast loader does not accept:".format(
+                len(skipped)))
+            for path in skipped:
+                print("    {}".format(path))
+        return
+    results = benchmark(repeats=args.repeats)
+    if not WITH_LIBYAML:
+        print("LibYAML is not available.")
+    for map_name, python_time, fast_time, c_time in results:
+        line = "{:<28} python {:8.2f} ms".format(map_name, python_time*1000)
+        for label,time in (("fast", fast_time), ("C", c_time)):
+            if time is not None:
+                line += "   {} {:7.2f} ms x{:.1f}".format(label, time*1000,
+                                                         python_time/time)
+        print(line)
+    python_total = sum(result[1] for result in results)
+    print("{} maps: python {:.1f} ms total".format(len(results),
+                                                   python_total*1000))
+    for label,column in (("fast", 2), ("C", 3)):
+        times = [result[column] for result in results]
+        if None not in times:
+            total = sum(times)
+            print("{} {:.1f} ms total (x{:.1f})".format(label, total*1000,
+                                                       python_total/total))
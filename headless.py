@@ -0,0 +1,21 @@
+"""
+Run the game without a display (see data/headless.py).  Example:
+
+    python headless.py --ticks 6000 --script walk.txt --seed 1
+"""
+
+import os
+import sys
+
+#Must be set before data.prepare is imported.
+os.environ["CABBAGES_HEADLESS"] = "1"
+
+import pygame as pg
+
+from data.headless import main
+
+
+if __name__ == '__main__':
+    main()
+    pg.quit()
+    sys.exit()
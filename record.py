@@ -0,0 +1,16 @@
+"""
+Record a play session for later replay (see data/replay.py).  Example:
+
+    python record.py desert.rec --world overworld.wrl --coords 5,5
+"""
+
+import sys
+import pygame as pg
+
+from data.replay import record_main
+
+
+if __name__ == '__main__':
+    record_main()
+    pg.quit()
+    sys.exit()
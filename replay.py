@@ -0,0 +1,22 @@
+"""
+Replay a recorded session headless, reporting its speed and whether it
+reached the recorded final state (see data/replay.py).  Example:
+
+    python replay.py desert.rec
+"""
+
+import os
+import sys
+
+#Must be set before data.prepare is imported.
+os.environ["CABBAGES_HEADLESS"] = "1"
+
+import pygame as pg
+
+from data.replay import replay_main
+
+
+if __name__ == '__main__':
+    status = replay_main()
+    pg.quit()
+    sys.exit(status)
@@ -0,0 +1,95 @@
+"""Tests for the least recently used level cache (level_cache.py)."""
+
+import pygame as pg
+import pytest
+
+from data.components import level_cache
+
+
+class FakeLevel(object):
+    """Stands in for a Level; records whether it was discarded."""
+    def __init__(self, size):
+        self.size = size
+        self.discarded = False
+
+    def discard(self):
+        self.discarded = True
+
+
+@pytest.fixture(autouse=True)
+def fake_sizes(monkeypatch):
+    """Size levels by their size attribute instead of their surfaces."""
+    monkeypatch.setattr(level_cache, "estimate_level_size",
+                        lambda level: level.size)
+
+
+def fill(cache, sizes):
+    """Put a FakeLevel of each size into cache under keys 0, 1, ..."""
+    levels = [FakeLevel(size) for size in sizes]
+    for key,level in enumerate(levels):
+        cache.put(key, level)
+    return levels
+
+
+def test_evicts_least_recently_used():
+    cache = level_cache.LevelCache(budget=100)
+    levels = fill(cache, [40, 40])
+    cache.get(0)
+    newest = FakeLevel(40)
+    cache.put(2, newest)
+    assert list(cache.levels) == [0, 2]
+    assert levels[1].discarded and not levels[0].discarded
+    assert cache.used == 80
+    assert cache.stats()["evictions"] == 1
+
+
+def test_newest_level_is_kept_over_budget():
+    cache = level_cache.LevelCache(budget=100)
+    levels = fill(cache, [40, 150])
+    assert list(cache.levels) == [1]
+    assert levels[0].discarded and not levels[1].discarded
+    assert cache.used == 150
+
+
+def test_put_replaces_existing_key():
+    cache = level_cache.LevelCache(budget=100)
+    fill(cache, [30, 30])
+    cache.put(0, FakeLevel(50))
+    assert list(cache.levels) == [1, 0]
+    assert cache.used == 80
+
+
+def test_counts_hits_and_misses():
+    cache = level_cache.LevelCache()
+    fill(cache, [1])
+    assert cache.get(0) is not None
+    assert cache.get(1) is None
+    assert 0 in cache and 1 not in cache
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_reserved_bytes_count_against_budget():
+    cache = level_cache.LevelCache(budget=100)
+    levels = fill(cache, [30, 30, 30])
+    cache.reserve(50)
+    assert list(cache.levels) == [2]
+    assert [level.discarded for level in levels] == [True, True, False]
+    cache.reserve(0)
+    cache.put(3, FakeLevel(30))
+    assert list(cache.levels) == [2, 3]
+
+
+def test_clear_discards_everything():
+    cache = level_cache.LevelCache()
+    levels = fill(cache, [10, 20])
+    cache.clear()
+    assert len(cache) == 0 and cache.used == 0
+    assert all(level.discarded for level in levels)
+
+
+def test_surface_size_skips_subsurfaces():
+    surface = pg.Surface((10, 20), pg.SRCALPHA)
+    assert level_cache.surface_size(surface) == 10*20*4
+    assert level_cache.surface_size(surface.subsurface((0, 0, 5, 5))) == 0
+    assert level_cache.surface_size(None) == 0
@@ -0,0 +1,118 @@
+"""Tests for the precompiled map cache (data/map_cache.py)."""
+
+import os
+import sys
+
+import pytest
+
+from data import map_cache
+
+
+MAP_DICT = {"BG Colors" : {"fill" : (10, 20, 30, 255),
+                           (50, 100) : ("grass", (0, 128, 0, 255))},
+            "BG Tiles" : {(0, 0) : ("base", (50, 100)),
+                          (950, 650) : ("desert", (0, 0))},
+            "Enemies" : {(100, 150) : ("enemies", (0, 0), 1.5)},
+            "Push" : {}}
+
+
+@pytest.fixture
+def paths(tmp_path):
+    """Return the path of a source map and of its cache in tmp_path."""
+    source = tmp_path/"test.map"
+    source.write_text(u"placeholder map source\n")
+    return str(source), str(tmp_path/"cache"/"test.mapc")
+
+
+def read_header(cache_path):
+    with open(cache_path, "rb") as myfile:
+        return map_cache.HEADER.unpack_from(myfile.read())
+
+
+def test_round_trip(paths):
+    source, cache = paths
+    map_cache.write_cache(MAP_DICT, source, cache)
+    assert map_cache.read_cache(cache, source) == MAP_DICT
+    assert os.listdir(os.path.dirname(cache)) == ["test.mapc"]
+
+
+def test_layers_use_fixed_width_records(paths):
+    source, cache = paths
+    map_cache.write_cache(MAP_DICT, source, cache)
+    with open(cache, "rb") as myfile:
+        data = myfile.read()
+    strings, offset = map_cache.read_strings(data, map_cache.HEADER.size)
+    kinds = {}
+    for _ in range(len(MAP_DICT)):
+        name, kind, length = map_cache.LAYER_HEADER.unpack_from(data, offset)
+        offset += map_cache.LAYER_HEADER.size
+        kinds[strings[name]] = kind
+        reader = map_cache.LAYER_READERS[kind]
+        offset = reader(data, offset, length, strings)[1]
+    assert kinds == {"BG Colors" : map_cache.KIND_COLORS,
+                     "BG Tiles" : map_cache.KIND_TILES,
+                     "Enemies" : map_cache.KIND_BLOB,
+                     "Push" : map_cache.KIND_TILES}
+    assert offset == len(data)
+
+
+def test_changed_source_is_stale(paths):
+    source, cache = paths
+    map_cache.write_cache(MAP_DICT, source, cache)
+    with open(source, "a") as myfile:
+        myfile.write("edited\n")
+    os.utime(source, (0, os.path.getmtime(source)+10))
+    with pytest.raises(map_cache.StaleCacheError):
+        map_cache.read_cache(cache, source)
+
+
+def test_touched_source_rewrites_mtime(paths):
+    source, cache = paths
+    map_cache.write_cache(MAP_DICT, source, cache)
+    mtime = os.path.getmtime(source)+10
+    os.utime(source, (mtime, mtime))
+    assert map_cache.read_cache(cache, source) == MAP_DICT
+    assert read_header(cache)[4] == mtime
+
+
+def test_other_python_version_is_stale(paths):
+    source, cache = paths
+    map_cache.write_cache(MAP_DICT, source, cache)
+    header = list(read_header(cache))
+    header[2] = sys.version_info[0]+1
+    with open(cache, "rb") as myfile:
+        data = myfile.read()
+    with open(cache, "wb") as myfile:
+        myfile.write(map_cache.HEADER.pack(*header))
+        myfile.write(data[map_cache.HEADER.size:])
+    with pytest.raises(map_cache.StaleCacheError):
+        map_cache.read_cache(cache, source)
+
+
+def test_truncated_cache_raises_cache_error(paths):
+    source, cache = paths
+    map_cache.write_cache(MAP_DICT, source, cache)
+    with open(cache, "rb") as myfile:
+        data = myfile.read()
+    for length in range(len(data)):
+        with open(cache, "wb") as myfile:
+            myfile.write(data[:length])
+        with pytest.raises(map_cache.CACHE_ERRORS):
+            map_cache.read_cache(cache, source)
+
+
+def test_load_rebuilds_damaged_cache(paths, monkeypatch):
+    source, cache = paths
+    monkeypatch.setattr(map_cache, "CACHE_DIRECTORY", os.path.dirname(cache))
+    loads = []
+    def load_file(path):
+        loads.append(path)
+        return MAP_DICT
+    monkeypatch.setattr(map_cache.yaml_loader, "load_file", load_file)
+    assert map_cache.load(source) == MAP_DICT
+    with open(cache, "r+b") as myfile:
+        myfile.seek(map_cache.HEADER.size)
+        myfile.write(b"\xff"*4)
+    assert map_cache.load(source) == MAP_DICT
+    assert map_cache.load(source) == MAP_DICT
+    assert loads == [source, source]
@@ -0,0 +1,69 @@
+"""Tests for the level's layered draw group (render_queue.py)."""
+
+import random
+
+import pygame as pg
+
+from data.components import render_queue
+
+
+def make_sprite(y, layer=None):
+    sprite = pg.sprite.Sprite()
+    sprite.rect = pg.Rect(0, y, 10, 10)
+    if layer is not None:
+        sprite._layer = layer
+    return sprite
+
+
+def build(group_class, fixed, actors):
+    """Return a group_class holding fixed (sprite, layer) pairs and actors."""
+    group = group_class()
+    for sprite,layer in fixed:
+        group.add(sprite, layer=layer)
+    for sprite in actors:
+        group.add(sprite, layer=0)
+    return group
+
+
+def test_matches_change_layer():
+    rng = random.Random(4)
+    for _ in range(50):
+        fixed = [(make_sprite(0), rng.choice((-3, -1, 40, 750)))
+                 for _ in range(rng.randrange(10))]
+        actors = [make_sprite(rng.randrange(0, 60, 5), rng.choice((None, 0)))
+                  for _ in range(rng.randrange(1, 20))]
+        expected = build(pg.sprite.LayeredUpdates, fixed, actors)
+        queue = build(render_queue.RenderQueue, fixed, actors)
+        for _ in range(3):
+            for sprite in actors:
+                sprite.rect.y = rng.randrange(0, 60, 5)
+            order = actors[:]
+            rng.shuffle(order)
+            for sprite in order:
+                expected.change_layer(sprite, sprite.rect.centery)
+            queue.sort_actors(order)
+            assert queue.sprites() == expected.sprites()
+            assert queue.layers() == expected.layers()
+
+
+def test_equal_layers_keep_actor_order():
+    actors = [make_sprite(20) for _ in range(5)]
+    queue = build(render_queue.RenderQueue, [], actors)
+    queue.sort_actors(actors[::-1])
+    assert queue.sprites() == actors[::-1]
+
+
+def test_actors_follow_fixed_sprites_on_their_layer():
+    tile = make_sprite(0)
+    actor = make_sprite(20)
+    queue = build(render_queue.RenderQueue, [(tile, 25)], [actor])
+    queue.sort_actors([actor])
+    assert queue.sprites() == [tile, actor]
+    assert queue.get_layer_of_sprite(actor) == 25
+
+
+def test_sets_sprite_layer_attribute():
+    actor = make_sprite(20, layer=0)
+    queue = build(render_queue.RenderQueue, [], [actor])
+    queue.sort_actors([actor])
+    assert actor._layer == 25
@@ -0,0 +1,83 @@
+"""Tests for the save slot store (save_store.py)."""
+
+import os
+import zlib
+
+import pytest
+
+from data import save_store
+
+
+PLAYER = {"name" : "Abe",
+          "save_world_coords" : (5, 5),
+          "identifiers" : {"central.map" : {"kill", "chest"}},
+          "inventory" : {(1, 2) : ["key", (3, 4)]},
+          "health" : 28}
+
+
+@pytest.fixture(params=save_store.ENCODINGS)
+def store(request, tmp_path):
+    return save_store.SaveStore(str(tmp_path), request.param)
+
+
+def write_record(store, slot, data):
+    with open(store.get_path(slot), "wb") as myfile:
+        myfile.write(data)
+
+
+def test_encode_decode_restores_types():
+    decoded = save_store.decode(save_store.encode(PLAYER))
+    assert decoded == PLAYER
+    assert isinstance(decoded["save_world_coords"], tuple)
+    assert isinstance(decoded["identifiers"]["central.map"], set)
+    assert isinstance(list(decoded["inventory"])[0], tuple)
+
+
+def test_round_trip(store):
+    store.save(1, PLAYER)
+    assert store.load(1) == PLAYER
+    assert store.load_all() == [save_store.EMPTY, PLAYER, save_store.EMPTY]
+    assert os.listdir(store.directory) == ["slot1.sav"]
+
+
+def test_clear_empties_slot(store):
+    store.save(0, PLAYER)
+    store.clear(0)
+    store.clear(0)
+    assert store.load(0) == save_store.EMPTY
+
+
+def test_slot_out_of_range(store):
+    with pytest.raises(IndexError):
+        store.get_path(store.slots)
+
+
+def test_unknown_encoding():
+    with pytest.raises(ValueError):
+        save_store.SaveStore(encoding="yaml")
+
+
+@pytest.mark.parametrize("record", [
+    b"garbage",
+    b"CABBAGES-SAVE 2 json\n{}",
+    b"CABBAGES-SAVE 1 json\n{bad json",
+    b"CABBAGES-SAVE 1 json\n\xff\xfe",
+    b"CABBAGES-SAVE 1 json\n{\"__dict__\" : [1]}",
+    b"CABBAGES-SAVE 1 binary\nnot zlib",
+    b"CABBAGES-SAVE 1 binary\n"+zlib.compress(b"[1, 2")])
+def test_damaged_slot_is_empty(store, record):
+    store.save(0, PLAYER)
+    write_record(store, 1, record)
+    with pytest.raises(save_store.DAMAGED_ERRORS):
+        store.load(1)
+    assert store.load_all() == [PLAYER, save_store.EMPTY, save_store.EMPTY]
+
+
+def test_malformed_legacy_save_is_ignored(store, tmp_path):
+    path = str(tmp_path/"save_data.dat")
+    for text in ("- [unclosed\n", "just a string\n"):
+        with open(path, "w") as myfile:
+            myfile.write(text)
+        assert store.import_legacy(path) == 0
+        assert os.path.exists(path)
+    assert store.import_legacy(str(tmp_path/"missing.dat")) == 0
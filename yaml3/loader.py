@@ -1,5 +1,5 @@
 
-__all__ = ['BaseLoader', 'SafeLoader', 'Loader']
+__all__ = ['BaseLoader', 'SafeLoader', 'Loader', 'FastLoader']
 
 from .reader import *
 from .scanner import *
@@ -38,3 +38,14 @@ class Loader(Reader, Scanner, Parser, Composer, Constructor, Resolver):
         Constructor.__init__(self)
         Resolver.__init__(self)
 
+class FastLoader(FastReader, FastScanner, Parser, Composer, Constructor,
+        Resolver):
+
+    def __init__(self, stream):
+        FastReader.__init__(self, stream)
+        FastScanner.__init__(self)
+        Parser.__init__(self)
+        Composer.__init__(self)
+        Constructor.__init__(self)
+        Resolver.__init__(self)
+
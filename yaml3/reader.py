@@ -15,7 +15,7 @@
 #   reader.index - the number of the current character.
 #   reader.line, stream.column - the line and the column of the current character.
 
-__all__ = ['Reader', 'ReaderError']
+__all__ = ['Reader', 'FastReader', 'ReaderError']
 
 from .error import YAMLError, Mark
 
@@ -184,6 +184,96 @@ class Reader(object):
         if not data:
             self.eof = True
 
+class LazyMark(Mark):
+    # A Mark that works out its line and column from the buffer only when
+    # asked (they are only needed for error messages).
+
+    def __init__(self, name, buffer, pointer):
+        self.name = name
+        self.index = pointer
+        self.buffer = buffer
+        self.pointer = pointer
+
+    @property
+    def line(self):
+        return self.buffer.count('\n', 0, self.pointer)
+
+    @property
+    def column(self):
+        return self.pointer-(self.buffer.rfind('\n', 0, self.pointer)+1)
+
+class FastReader(Reader):
+    # A Reader for a string held entirely in memory.
+    # - the whole buffer is checked once and never updated,
+    # - `forward` only moves the pointer,
+    # - `line` and `column` are worked out from the buffer when asked for
+    #   and marks are LazyMarks.
+    # Only '\n' line breaks are supported; use `accepts` to check that the
+    # data can be read (otherwise use Reader).
+
+    SLOW_CHARACTERS = re.compile('[\r\x85\u2028\u2029\uFEFF]')
+
+    @classmethod
+    def accepts(cls, data):
+        return isinstance(data, str) and not cls.SLOW_CHARACTERS.search(data)
+
+    def __init__(self, stream):
+        if not self.accepts(stream):
+            raise ValueError("FastReader only reads strings with '\\n' "
+                    "line breaks")
+        self.name = "<unicode string>"
+        self.stream = None
+        self.eof = True
+        self.raw_buffer = None
+        self.encoding = None
+        self.buffer = ''
+        self.pointer = 0
+        self.check_printable(stream)
+        self.buffer = stream+'\0'
+        self.located_pointer = 0
+        self.located_line = 0
+        self.located_line_start = 0
+
+    def peek(self, index=0):
+        return self.buffer[self.pointer+index]
+
+    def prefix(self, length=1):
+        return self.buffer[self.pointer:self.pointer+length]
+
+    def forward(self, length=1):
+        self.pointer += length
+
+    def locate(self):
+        # Bring the line and line start up to date with the pointer.
+        pointer = self.pointer
+        if pointer != self.located_pointer:
+            if pointer < self.located_pointer:
+                self.located_pointer = self.located_line = 0
+            self.located_line += self.buffer.count('\n',
+                    self.located_pointer, pointer)
+            self.located_line_start = self.buffer.rfind('\n', 0, pointer)+1
+            self.located_pointer = pointer
+
+    @property
+    def index(self):
+        return self.pointer
+
+    @property
+    def line(self):
+        self.locate()
+        return self.located_line
+
+    @property
+    def column(self):
+        self.locate()
+        return self.pointer-self.located_line_start
+
+    def get_mark(self):
+        return LazyMark(self.name, self.buffer, self.pointer)
+
+    def get_mark_at(self, pointer):
+        return LazyMark(self.name, self.buffer, pointer)
+
 #try:
 #    import psyco
 #    psyco.bind(Reader)
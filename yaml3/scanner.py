@@ -24,11 +24,13 @@
 # Read comments in the Scanner code for more details.
 #
 
-__all__ = ['Scanner', 'ScannerError']
+__all__ = ['Scanner', 'FastScanner', 'ScannerError']
 
 from .error import MarkedYAMLError
 from .tokens import *
 
+import re
+
 class ScannerError(MarkedYAMLError):
     pass
 
@@ -1440,6 +1442,83 @@ class Scanner:
             return ch
         return ''
 
+class FastScanner(Scanner):
+    # A Scanner for use with FastReader (it reads `buffer` and `pointer`
+    # directly, so the whole document must be in the buffer):
+    # - plain scalars are found with a regular expression instead of
+    #   peeking at every character,
+    # - flow sequences of integers like `[200, 550]`, as written by the
+    #   Dumper for positions and sizes, are tokenized in one step.
+    # The token stream is the same as the one Scanner produces.
+
+    PLAIN_END = re.compile('[\0 \t\r\n\x85\u2028\u2029]'
+            '|:(?=[\0 \t\r\n\x85\u2028\u2029])')
+    FLOW_PLAIN_END = re.compile('[\0 \t\r\n\x85\u2028\u2029,:?\\[\\]{}]')
+    INT_SEQUENCE = re.compile(r'(?:-?[0-9]+, )*-?[0-9]+\]')
+    INT = re.compile(r'-?[0-9]+')
+
+    def fetch_flow_sequence_start(self):
+        Scanner.fetch_flow_sequence_start(self)
+        match = self.INT_SEQUENCE.match(self.buffer, self.pointer)
+        if match is None:
+            return
+        # Add the SCALAR and FLOW-ENTRY tokens exactly as fetch_plain and
+        # fetch_flow_entry would.  Simple keys inside the sequence would be
+        # removed at the next ',' or ']' so none are saved.
+        start = self.pointer
+        for number in self.INT.finditer(self.buffer, start, match.end()):
+            if number.start() != start:
+                self.tokens.append(FlowEntryToken(
+                    self.get_mark_at(number.start()-2),
+                    self.get_mark_at(number.start()-1)))
+            self.tokens.append(ScalarToken(number.group(), True,
+                    self.get_mark_at(number.start()),
+                    self.get_mark_at(number.end())))
+        # Add FLOW-SEQUENCE-END as fetch_flow_collection_end would.
+        self.flow_level -= 1
+        self.allow_simple_key = False
+        self.tokens.append(FlowSequenceEndToken(
+                self.get_mark_at(match.end()-1),
+                self.get_mark_at(match.end())))
+        self.pointer = match.end()
+
+    def scan_plain(self):
+        # Same as Scanner.scan_plain, but the length of each chunk is found
+        # by a regular expression search.
+        chunks = []
+        start_mark = self.get_mark()
+        end_mark = start_mark
+        indent = self.indent+1
+        spaces = []
+        while True:
+            if self.peek() == '#':
+                break
+            if self.flow_level:
+                end = self.FLOW_PLAIN_END.search(self.buffer, self.pointer)
+            else:
+                end = self.PLAIN_END.search(self.buffer, self.pointer)
+            length = end.start()-self.pointer
+            ch = self.peek(length)
+            # It's not clear what we should do with ':' in the flow context.
+            if (self.flow_level and ch == ':'
+                    and self.peek(length+1) not in '\0 \t\r\n\x85\u2028\u2029,[]{}'):
+                self.forward(length)
+                raise ScannerError("while scanning a plain scalar", start_mark,
+                    "found unexpected ':'", self.get_mark(),
+                    "Please check http://pyyaml.org/wiki/YAMLColonInFlowContext for details.")
+            if length == 0:
+                break
+            self.allow_simple_key = False
+            chunks.extend(spaces)
+            chunks.append(self.prefix(length))
+            self.forward(length)
+            end_mark = self.get_mark()
+            spaces = self.scan_plain_spaces(indent, start_mark)
+            if not spaces or self.peek() == '#' \
+                    or (not self.flow_level and self.column < indent):
+                break
+        return ScalarToken(''.join(chunks), True, start_mark, end_mark)
+
 #try:
 #    import psyco
 #    psyco.bind(Scanner)